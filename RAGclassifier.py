@@ -1,58 +1,91 @@
-import faiss
-import numpy as np
-import pandas as pd
 from datetime import datetime
-from sentence_transformers import SentenceTransformer
 from collections import Counter
+import chat_log
 
 class RAGSimilarityClassifier:
-    def __init__(self, dataset_path: str, embeddings_path: str, filepath: str,  model_name='all-MiniLM-L6-v2'):
-        # Load cleaned dataset and embeddings
-        self.df = pd.read_csv(dataset_path)
-        self.texts = self.df['text'].tolist()
-        self.labels = self.df['label'].tolist()
-        self.embeddings = np.load(embeddings_path)
+    def __init__(self, dataset_path: str, embeddings_path: str, filepath: str = None,  model_name='all-MiniLM-L6-v2',
+                 human_messages: list = None, corpus=None, client=None, model=None, archive=None,
+                 user_id=None):
         self.filepath = filepath
-
-        # Load embedding model
-        self.model = SentenceTransformer(model_name)
-
-        # Build FAISS index
-        self.dimension = self.embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.index.add(self.embeddings)
+        # Messages already read from the message store; when given, the chat file is not parsed.
+        self.human_messages = human_messages
+        # ChatArchive to read `user_id`'s full history from instead of the file at `filepath`.
+        self.archive = archive
+        self.user_id = user_id
+        # ModelClient for a shared model server (model_server.py); nothing heavy is loaded in this process.
+        self.client = client
+        if client is not None:
+            self.corpus = None
+            self.model = None
+            return
+
+        # Base dataset/embeddings plus any appended delta segments; pass `corpus` to share one index.
+        if corpus is None:
+            from corpus_index import CorpusIndex
+            corpus = CorpusIndex(dataset_path, embeddings_path).load()
+        self.corpus = corpus
+
+        # Load embedding model; pass `model` to share one encoder.
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name)
+        self.model = model
+
+    @property
+    def index(self):
+        return self.corpus.index if self.corpus is not None else None
+
+    @property
+    def labels(self):
+        return self.corpus.labels if self.corpus is not None else None
 
     def chatprocessor(self):
         chat_dict = {'AI': [], 'Human': []}
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        with open(self.filepath, 'r', encoding="utf-8", errors="ignore") as f:
-            lines = f.readlines()
+        if self.human_messages is not None:
+            chat_dict['Human'] = list(self.human_messages)
+            return chat_dict
+
+        # With an archive, the user's compacted conversations are read along with the hot log.
+        if self.archive is not None:
+            history = self.archive.iter_messages(self.user_id, include_archive=True)
+        else:
+            history = chat_log.iter_messages(self.filepath)
+        for message in history:
+            if message.role == chat_log.USER:
+                chat_dict['Human'].append(message.text)
+            else:
+                chat_dict['AI'].append(message.text)
 
-        for line in lines:
-            line = line.strip()
+        print("Chat processed at: ", current_time)
+        return chat_dict
 
-            if line.startswith('You'):
-                chat_dict['Human'].append(line[5:])
+    def encode(self, texts: list, batch_size: int = 32):
+        if self.client is not None:
+            return self.client.encode(texts)
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
 
-            elif line.startswith('AI'):
-                chat_dict['AI'].append(line[4:])
+    def classify(self, texts: list, top_k: int = 1, batch_size: int = 32):
+        """Label each text with the label of its nearest reference example."""
+        if not texts:
+            return []
+        if self.client is not None:
+            return self.client.classify(texts, top_k=top_k)
 
-        print("Chat processed at: ", current_time)
-        return chat_dict
+        input_embeddings = self.encode(texts, batch_size=batch_size)
+        # Refreshes the corpus first, so newly appended segments are searched without a restart.
+        distances, indices, predicted_labels = self.corpus.search(input_embeddings, top_k)
+        return predicted_labels
 
     def predict_labels(self, top_k: int = 1):
         chat_dict = self.chatprocessor()
         human_sent = chat_dict['Human']
         print(len(human_sent))
+        if not human_sent:
+            return [], {}
 
-        input_embeddings = self.model.encode(human_sent, convert_to_numpy=True, show_progress_bar=False)
-        distances, indices = self.index.search(input_embeddings, top_k)
-        
-        predicted_labels = []
-        for i, idx in enumerate(indices):
-            label = self.labels[idx[0]]
-            predicted_labels.append(label)
+        predicted_labels = self.classify(human_sent, top_k=top_k)
 
         # Count frequency of predicted labels
         label_counts = dict(Counter(predicted_labels))
@@ -61,9 +94,11 @@ class RAGSimilarityClassifier:
 if __name__=="__main__":
     embedding_path = './model/embeddings.npy'
     dataset_path = './model/balanced_cleaned_dataset.csv'
-    filepath = './chat_logs/chat_history_anmol21.txt'
+    from chat_archive import ChatArchive
+    from storage import LocalStorage
 
-    classifier = RAGSimilarityClassifier(dataset_path, embedding_path, filepath)
+    classifier = RAGSimilarityClassifier(dataset_path, embedding_path, archive=ChatArchive(LocalStorage('.')),
+                                         user_id='anmol21')
 
     predicted_labels, label_counts = classifier.predict_labels()
 
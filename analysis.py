@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import NamedTuple, Optional
+
+import chat_log
+import scoring
+
+RAG = "rag"
+KEYWORD = "keyword"
+
+
+class UserAnalysis(NamedTuple):
+    user_id: str
+    version: int
+    message_count: int
+    label_counts: dict
+    # None unless the RAG classifier produced the labels; keyword labels carry no mood information.
+    mood_score: Optional[float]
+    suicide_percentage: Optional[float]
+    classifier: Optional[str]
+    computed_at: float
+
+
+class AnalysisService:
+    def __init__(self, message_store, get_chat_file, classify, fallback=None, on_computed=None, max_entries=1024):
+        """
+        Derives every score for a user (label counts, mood score, suicide percentage) from one
+        classification pass over their stored messages.
+
+        Results are memoized per chat-history version: the user's last message seq, which only
+        moves when a message is appended. Callers asking for a version that is already being
+        computed wait for that computation instead of starting their own.
+
+        - classify(user_id, rows) -> label_counts, the RAG path
+        - fallback(texts) -> label_counts, used when classify raises
+        - on_computed(analysis) runs once per fresh result, e.g. to record the score
+        """
+        self.message_store = message_store
+        self.get_chat_file = get_chat_file
+        self.classify = classify
+        self.fallback = fallback
+        self.on_computed = on_computed
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def version(self, user_id):
+        self.message_store.ensure_imported(user_id, self.get_chat_file(user_id))
+        return self.message_store.last_seq(user_id)
+
+    def analyze(self, user_id):
+        """Return the UserAnalysis for the user's current history, computing it at most once per version."""
+        version = self.version(user_id)
+        with self._lock:
+            cached = self._results.get(user_id)
+            if cached is not None and cached.version == version:
+                self._results.move_to_end(user_id)
+                return cached
+            flight = self._in_flight.get(user_id)
+            if flight is not None and flight[0] == version:
+                future = flight[1]
+                leader = False
+            else:
+                future = Future()
+                self._in_flight[user_id] = (version, future)
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            analysis = self._compute(user_id, version)
+        except BaseException as e:
+            with self._lock:
+                self._drop_in_flight(user_id, future)
+            future.set_exception(e)
+            raise
+
+        # Storing the result and leaving the in-flight table happen under one lock, so a caller
+        # never finds neither and starts a second computation of the same version.
+        with self._lock:
+            cached = self._results.get(user_id)
+            # Keyword fallbacks are cheap and the RAG failure may be transient, so only RAG results are kept.
+            if analysis.classifier != KEYWORD and (cached is None or cached.version <= version):
+                self._results[user_id] = analysis
+                self._results.move_to_end(user_id)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+            self._drop_in_flight(user_id, future)
+        future.set_result(analysis)
+
+        if self.on_computed is not None and analysis.message_count:
+            try:
+                self.on_computed(analysis)
+            except Exception as e:
+                print(f"[analysis] on_computed failed for user_id={user_id}: {e}")
+        return analysis
+
+    def _drop_in_flight(self, user_id, future):
+        if self._in_flight.get(user_id, (None, None))[1] is future:
+            del self._in_flight[user_id]
+
+    def _compute(self, user_id, version):
+        # Rows appended after `version` was read belong to the next version.
+        rows = [row for row in self.message_store.user_messages(user_id, role=chat_log.USER) if row.seq <= version]
+        if not rows:
+            return UserAnalysis(user_id, version, 0, {}, None, None, None, time.time())
+
+        started = time.perf_counter()
+        try:
+            label_counts = self.classify(user_id, rows)
+            classifier = RAG
+        except MemoryError:
+            if self.fallback is None:
+                raise
+            print(f"[analysis] RAG classifier MemoryError (std::bad_alloc). Falling back to keyword detector for user_id={user_id}")
+            label_counts = self.fallback([row.text for row in rows])
+            classifier = KEYWORD
+        except Exception as rag_error:
+            if self.fallback is None:
+                raise
+            print(f"[analysis] RAG classifier failed: {rag_error}. Falling back to keyword detector for user_id={user_id}")
+            label_counts = self.fallback([row.text for row in rows])
+            classifier = KEYWORD
+
+        analysis = UserAnalysis(
+            user_id=user_id,
+            version=version,
+            message_count=len(rows),
+            label_counts=label_counts,
+            mood_score=scoring.mood_score(label_counts) if classifier == RAG else None,
+            suicide_percentage=scoring.suicide_percentage(label_counts),
+            classifier=classifier,
+            computed_at=time.time(),
+        )
+        print(f"[analysis] user_id={user_id}, version={version}, messages={len(rows)}, "
+              f"classifier={classifier}, took={time.perf_counter() - started:.2f}s")
+        return analysis
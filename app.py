@@ -1,20 +1,24 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from conversation import CounselorChatbot
-from recommendation import CounselorAI
-from suicide_detector import MentalHealthMonitor
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, abort
 from dotenv import load_dotenv
+from lazy_loader import LazyRegistry
+from message_store import MessageStore
+from storage import LocalStorage, get_storage
+from chat_archive import ChatArchive
+from llm_gateway import LLMUnavailable, get_llm_gateway
+from model_client import get_model_client, model_server_address
+from analysis import AnalysisService, RAG
+from assets import AssetManifest, IMMUTABLE_CACHE_CONTROL
+from collections import Counter
 import sqlite3
 import json
 import uuid  # <-- for generating unique session_id
 import os
 import traceback
 import re
-
-try:
-    from RAGclassifier import RAGSimilarityClassifier
-except Exception as import_error:
-    RAGSimilarityClassifier = None
-    print(f"[startup] RAG classifier import skipped: {import_error}")
+import threading
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'
@@ -24,6 +28,18 @@ IS_VERCEL = os.getenv("VERCEL") == "1"
 BASE_DATA_DIR = "/tmp" if IS_VERCEL else "."
 DB_PATH = os.getenv("DB_PATH", os.path.join(BASE_DATA_DIR, "users.db"))
 
+# Chat transcripts, recommendations and score history live in STORAGE_BACKEND
+# (local files under BASE_DATA_DIR by default, or a shared backend for multi-node deployments).
+storage = get_storage(BASE_DATA_DIR)
+# With a shared backend every node reads chat history from the shared message log.
+# Accounts (users) and the mental_scores table stay in the SQLite file at DB_PATH on each node,
+# so multi-node deployments still need sticky sessions or a shared database there.
+message_store = MessageStore(DB_PATH, shared_log=None if isinstance(storage, LocalStorage) else storage.scoped("messages"))
+chat_storage = storage.scoped("chat_logs")
+recommendation_storage = storage.scoped("recommendations")
+score_storage = storage.scoped("scores")
+chat_archive = ChatArchive(storage)
+
 def get_chat_dir():
     return os.path.join(BASE_DATA_DIR, "chat_logs")
 
@@ -31,10 +47,11 @@ def get_recommendation_dir():
     return os.path.join(BASE_DATA_DIR, "recommendations")
 
 def get_chat_file(user_id: str):
-    return os.path.join(get_chat_dir(), f"chat_history_{user_id}.txt")
+    """Local path of the user's chat transcript (a cached copy when storage is remote)."""
+    return chat_storage.local_path(f"chat_history_{user_id}.txt")
 
-def get_recommendation_file(user_id: str):
-    return os.path.join(get_recommendation_dir(), f"chat_{user_id}.txt")
+def get_recommendation_key(user_id: str):
+    return f"chat_{user_id}.txt"
 
 load_dotenv()
 
@@ -43,9 +60,106 @@ sender_pass = os.getenv("PASS")
 os.environ["RECOMMENDATION_DIR"] = get_recommendation_dir()
 
 
-chatbot = CounselorChatbot(chat_directory=get_chat_dir())
-counselor_ai = CounselorAI()
-detector = MentalHealthMonitor(sender_email=sender_mail, sender_password=sender_pass)
+# Heavy components (LangChain/Groq clients, FAISS/torch classifier stack) are built on
+# first use, or by the background warm-up once the server is taking requests.
+components = LazyRegistry()
+WARMUP_ENABLED = os.getenv("MINDEASE_WARMUP", "0" if IS_VERCEL else "1") == "1"
+# Seconds between background runs that archive closed conversations out of the hot chat logs (0 = off).
+CHAT_COMPACTION_INTERVAL = float(os.getenv("CHAT_COMPACTION_INTERVAL", "0" if IS_VERCEL else "3600"))
+_compaction_thread = None
+_compaction_lock = threading.Lock()
+
+# Minified, content-hashed static assets (see assets.py); rebuilt at startup when a source file changed.
+# On Vercel a build would run on every cold start, so there `python assets.py` runs before deploying instead.
+ASSET_BUILD_DIR = os.getenv("ASSET_BUILD_DIR", os.path.join(app.static_folder, "dist"))
+ASSET_AUTO_BUILD = os.getenv("ASSET_AUTO_BUILD", "0" if IS_VERCEL else "1") == "1"
+_assets_started = time.perf_counter()
+asset_manifest = AssetManifest(app.static_folder, ASSET_BUILD_DIR, auto_build=ASSET_AUTO_BUILD)
+components.record("assets.build", time.perf_counter() - _assets_started)
+
+@app.template_global()
+def asset_url(filename):
+    """Hashed URL for a static file, or the plain static URL if it has not been built."""
+    hashed = asset_manifest.hashed_path(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('hashed_asset', filename=hashed)
+
+def _build_chatbot():
+    from conversation import CounselorChatbot
+    return CounselorChatbot(chat_directory=get_chat_dir(), message_store=message_store, storage=chat_storage,
+                            archive=chat_archive)
+
+def _build_counselor_ai():
+    from recommendation import CounselorAI
+    return CounselorAI(message_store=message_store, storage=recommendation_storage, archive=chat_archive)
+
+def _build_detector():
+    from suicide_detector import MentalHealthMonitor
+    return MentalHealthMonitor(sender_email=sender_mail, sender_password=sender_pass)
+
+def _build_corpus():
+    from corpus_index import CorpusIndex
+    return CorpusIndex(dataset_path, embedding_path).load()
+
+def _build_encoder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer('all-MiniLM-L6-v2')
+
+def _build_rag_classifier():
+    from RAGclassifier import RAGSimilarityClassifier
+    client = get_model_client()
+    if client is not None:
+        return RAGSimilarityClassifier(dataset_path, embedding_path, client=client)
+    # One corpus index and one encoder per worker; the index applies new delta segments in place.
+    return RAGSimilarityClassifier(dataset_path, embedding_path, corpus=components.get("corpus"),
+                                   model=components.get("encoder"))
+
+components.register("chatbot", _build_chatbot)
+components.register("counselor_ai", _build_counselor_ai)
+components.register("detector", _build_detector)
+if model_server_address() is None:
+    # Without a model server the encoder and FAISS index load in this process.
+    components.register("corpus", _build_corpus)
+    components.register("encoder", _build_encoder)
+components.register("rag_classifier", _build_rag_classifier)
+
+def get_chatbot():
+    return components.get("chatbot")
+
+def get_counselor_ai():
+    return components.get("counselor_ai")
+
+def get_detector():
+    return components.get("detector")
+
+def get_rag_classifier():
+    """Return the shared RAGSimilarityClassifier, or None when faiss/torch are unavailable in this runtime."""
+    return components.get_optional("rag_classifier")
+
+@app.errorhandler(LLMUnavailable)
+def llm_unavailable(error):
+    """Shed load quickly instead of tying up a worker while the LLM is slow or down."""
+    print(f"[llm_gateway] {request.path}: {error}")
+    response = jsonify({"error": "The counselor is busy right now. Please try again in a moment."})
+    response.status_code = 503
+    response.headers["Retry-After"] = "5"
+    return response
+
+@app.before_request
+def start_background_warmup():
+    global _compaction_thread
+    if WARMUP_ENABLED:
+        components.warm_up(background=True)
+    if CHAT_COMPACTION_INTERVAL > 0 and _compaction_thread is None:
+        with _compaction_lock:
+            if _compaction_thread is None:
+                _compaction_thread = chat_archive.start_compaction(CHAT_COMPACTION_INTERVAL,
+                                                                   before_compact=import_before_archiving)
+
+def import_before_archiving(user_id: str):
+    """Make sure the message store has the user's full history before the hot log is trimmed."""
+    message_store.ensure_imported(user_id, get_chat_file(user_id))
 
 # DB Initialization
 def init_db():
@@ -74,6 +188,20 @@ def init_db():
             )
         ''')
         conn.commit()
+    message_store.init_schema()
+
+def record_mental_score(user_id: str, mood_score, label_counts: dict):
+    """Save a score to mental_scores and to the user's score history in shared storage."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO mental_scores (userid, score, label_counts)
+            VALUES (?, ?, ?)
+        ''', (user_id, mood_score, json.dumps(label_counts)))
+        conn.commit()
+
+    entry = {"score": mood_score, "label_counts": label_counts, "timestamp": time.time()}
+    score_storage.append(f"{user_id}.jsonl", (json.dumps(entry) + "\n").encode("utf-8"))
 
 def get_registered_email(user_id: str):
     with sqlite3.connect(DB_PATH) as conn:
@@ -82,16 +210,26 @@ def get_registered_email(user_id: str):
         row = cursor.fetchone()
         return row[0] if row else None
 
-def extract_user_messages(chat_file: str):
-    messages = []
-    with open(chat_file, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith("You:"):
-                messages.append(line[4:].strip())
-    return messages
+def classify_user_messages(user_id: str, rows):
+    """
+    Label counts over all of the user's messages. Labels are cached in the messages table,
+    so only messages added since the last run are sent through the RAG classifier.
+    """
+    uncached = [row for row in rows if row.label is None]
+    labels = {row.seq: row.label for row in rows if row.label is not None}
+
+    if uncached:
+        classifier = get_rag_classifier()
+        if classifier is None:
+            raise RuntimeError("RAG classifier unavailable in this runtime.")
+        predicted_labels = classifier.classify([row.text for row in uncached])
+        new_labels = [(row.seq, str(label)) for row, label in zip(uncached, predicted_labels)]
+        message_store.set_labels(user_id, new_labels)
+        labels.update(new_labels)
+
+    return dict(Counter(labels.values()))
 
-def keyword_based_suicide_labels(chat_file: str):
+def keyword_based_suicide_labels(user_msgs):
     """
     Lightweight fallback detector used when FAISS-based classifier cannot run.
     Returns label_counts compatible with existing detector.evaluate_and_notify().
@@ -105,7 +243,6 @@ def keyword_based_suicide_labels(chat_file: str):
         "tired of life", "give up"
     ]
 
-    user_msgs = extract_user_messages(chat_file)
     if not user_msgs:
         return {"normal": 1}
 
@@ -124,38 +261,38 @@ def keyword_based_suicide_labels(chat_file: str):
     normal_hits = max(total - suicide_hits, 0)
     return {"suicide": suicide_hits, "normal": normal_hits}
 
-def analyze_suicide_and_notify(user_id: str):
-    """Analyze chat history for suicide risk and send alert email if threshold is crossed."""
-    chat_file = get_chat_file(user_id)
-
-    if not os.path.exists(chat_file):
-        print(f"[suicide_detector] Skipped: chat file not found for user_id={user_id} -> {chat_file}")
-        return {"action_taken": False, "suicide_percentage": None}
-
+def record_analysis(analysis):
+    """Save each freshly computed RAG-based mood score."""
+    if analysis.classifier == RAG:
+        record_mental_score(analysis.user_id, analysis.mood_score, analysis.label_counts)
+
+# One classification pass per chat-history version feeds every score route.
+analysis_service = AnalysisService(
+    message_store,
+    get_chat_file,
+    classify_user_messages,
+    fallback=keyword_based_suicide_labels,
+    on_computed=record_analysis,
+)
+
+def analyze_suicide_and_notify(user_id: str, analysis=None):
+    """
+    Check the user's analysis for suicide risk and send an alert email if the threshold is crossed.
+    Pass `analysis` when the caller already has one, so the check uses exactly that result.
+    """
     try:
-        # Try FAISS/RAG-based classifier first.
-        # If it fails due to memory/runtime constraints, fallback to lightweight keyword model.
-        try:
-            if RAGSimilarityClassifier is None:
-                raise RuntimeError("RAG classifier unavailable in this runtime.")
-            classifier = RAGSimilarityClassifier(dataset_path, embedding_path, filepath=chat_file)
-            _, label_counts = classifier.predict_labels()
-            print(f"[suicide_detector] Using RAG classifier for user_id={user_id}")
-        except MemoryError:
-            print(f"[suicide_detector] RAG classifier MemoryError (std::bad_alloc). Falling back to keyword detector for user_id={user_id}")
-            label_counts = keyword_based_suicide_labels(chat_file)
-        except Exception as rag_error:
-            print(f"[suicide_detector] RAG classifier failed: {rag_error}. Falling back to keyword detector for user_id={user_id}")
-            label_counts = keyword_based_suicide_labels(chat_file)
-
-        total = sum(label_counts.values())
-        suicide_count = label_counts.get('suicide', 0)
-
-        if total == 0:
+        if analysis is None:
+            analysis = analysis_service.analyze(user_id)
+        if not analysis.message_count:
+            print(f"[suicide_detector] Skipped: no chat history found for user_id={user_id}")
+            return {"action_taken": False, "suicide_percentage": None}
+
+        label_counts = analysis.label_counts
+        percentage = analysis.suicide_percentage
+        if percentage is None:
             print(f"[suicide_detector] Skipped: no labels to evaluate for user_id={user_id}")
             return {"action_taken": False, "suicide_percentage": 0}
 
-        percentage = (suicide_count / total) * 100
         print(f"[suicide_detector] user_id={user_id}, suicide_percentage={percentage:.2f}%")
 
         if percentage >= 3:
@@ -165,7 +302,7 @@ def analyze_suicide_and_notify(user_id: str):
                 return {"action_taken": False, "suicide_percentage": percentage}
 
             print(f"[suicide_detector] TRIGGERED for user_id={user_id}. Attempting alert to {user_mail}")
-            email_sent = detector.evaluate_and_notify(label_counts=label_counts, user_email=user_mail)
+            email_sent = get_detector().evaluate_and_notify(label_counts=label_counts, user_email=user_mail)
             print(f"[suicide_detector] Email sent status for user_id={user_id}: {email_sent}")
             return {"action_taken": bool(email_sent), "suicide_percentage": percentage}
 
@@ -176,10 +313,34 @@ def analyze_suicide_and_notify(user_id: str):
         traceback.print_exc()
         return {"action_taken": False, "suicide_percentage": None}
 
+@app.route('/assets/<path:filename>')
+def hashed_asset(filename):
+    """Serve a built asset, pre-compressed when the client accepts it, with an immutable cache lifetime."""
+    resolved = asset_manifest.resolve(filename, request.headers.get("Accept-Encoding", ""))
+    if resolved is None:
+        abort(404)
+    path, encoding, etag = resolved
+
+    response = send_file(path, mimetype=asset_manifest.mimetype(filename), conditional=False, etag=False)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
 @app.route('/')
 def home():
     return render_template('index.html')
 
+@app.route('/startup_report')
+def startup_report():
+    return jsonify(components.startup_report())
+
+@app.route('/llm_status')
+def llm_status():
+    return jsonify(get_llm_gateway().stats())
+
 @app.route('/chat', methods=['GET', 'POST'])
 def chat():
     return redirect(url_for('dashboard'))
@@ -233,48 +394,48 @@ def mental_score():
         flash("Please login to view your mental score.", "error")
         return redirect(url_for("login"))
 
-    chat_file = get_chat_file(user_id)
-    dataset_path = './model/balanced_cleaned_dataset.csv'
-    embedding_path = './model/embeddings.npy'
-
-    if not os.path.exists(chat_file):
-        flash("No chat history found to calculate score.", "warning")
-        return jsonify({"error": f"File not found for userid: {user_id} and filepath: {chat_file}"}), 500
-
     try:
-        if RAGSimilarityClassifier is None:
+        analysis = analysis_service.analyze(user_id)
+        if not analysis.message_count:
+            flash("No chat history found to calculate score.", "warning")
+            return jsonify({"error": f"No chat history found for userid: {user_id}"}), 500
+        if analysis.mood_score is None:
             return jsonify({"error": "RAG classifier unavailable in this runtime."}), 500
-        classifier = RAGSimilarityClassifier(dataset_path, embedding_path, filepath=chat_file)
-        predicted_labels, label_counts = classifier.predict_labels()
-
-        # Calculate an overall score (example: stress = 1, anxiety = 2, depression = 3, PTSD = 4)
-        mood_weights = {
-            "normal": 4,
-            "stress": 3,
-            "anxiety": 2,
-            "depression": 1,
-            "PTSD": 0
-        }
-
-        total_score = sum(mood_weights.get(label, 0) * count for label, count in label_counts.items())
-        total_msgs = sum(label_counts.values())
-        mood_score = round(total_score / total_msgs, 2) if total_msgs > 0 else 0
-
-        # Save to DB
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO mental_scores (userid, score, label_counts)
-                VALUES (?, ?, ?)
-            ''', (user_id, mood_score, json.dumps(label_counts)))
-            conn.commit()
 
-        return jsonify({"mood_score": mood_score})
+        # The score was saved to the DB when this analysis was computed.
+        return jsonify({"mood_score": analysis.mood_score})
 
     except Exception as e:
         return jsonify({"error": f"Error calculating score: {str(e)}"}), 500
 
 
+@app.route('/analysis')
+def combined_analysis():
+    """Mood score, suicide percentage and label counts from one (memoized) classification pass."""
+    user_id = session.get("user_id")
+    if not user_id:
+        flash("Please login to view your mental score.", "error")
+        return redirect(url_for("login"))
+
+    try:
+        analysis = analysis_service.analyze(user_id)
+    except Exception as e:
+        return jsonify({"error": f"Error calculating score: {str(e)}"}), 500
+    if not analysis.message_count:
+        return jsonify({"error": f"No chat history found for userid: {user_id}"}), 500
+
+    result = analyze_suicide_and_notify(user_id, analysis)
+    return jsonify({
+        "mood_score": analysis.mood_score,
+        "suicide_percentage": analysis.suicide_percentage,
+        "action_taken": result["action_taken"],
+        "label_counts": analysis.label_counts,
+        "message_count": analysis.message_count,
+        "classifier": analysis.classifier,
+        "version": analysis.version,
+    })
+
+
 @app.route('/get_recommendation')
 def get_recommendation():
     user_id = session.get("user_id")
@@ -284,21 +445,22 @@ def get_recommendation():
         return redirect(url_for("login"))
 
     chat_file = get_chat_file(user_id)
-    rec_file = get_recommendation_file(user_id)
+    rec_key = get_recommendation_key(user_id)
 
     # If recommendation doesn't exist, generate it
-    if not os.path.exists(rec_file):
-        if os.path.exists(chat_file):
-            counselor_ai.generate_recommendation(chat_file, user_id)
+    recommendation_data = recommendation_storage.read(rec_key)
+    if recommendation_data is None:
+        if message_store.has_messages(user_id) or os.path.exists(chat_file):
+            recommendation_text = get_counselor_ai().generate_recommendation(
+                chat_file, user_id, session_id=session.get("session_id")
+            )
+            return recommendation_text
         else:
             flash("No chat history found to generate recommendation.", "warning")
             return render_template("recommendations.html", recommendation=None)
 
     # Read the recommendation
-    with open(rec_file, "r", encoding="utf-8") as file:
-        recommendation_text = file.read()
-
-        return recommendation_text
+    return recommendation_data.decode("utf-8")
 
 @app.route('/recommendation')
 def recommendation():
@@ -411,10 +573,12 @@ def get_response():
         return jsonify({"error": "No active session."}), 403
 
     try:
-        ai_response = chatbot.chat(user_id, user_input)
+        ai_response = get_chatbot().chat(user_id, user_input, session_id=session.get("session_id"))
         if not ai_response:
             return jsonify({"response": "I am here with you. Could you share a little more?"})
         return jsonify({"response": str(ai_response)})
+    except LLMUnavailable:
+        raise
     except ValueError as e:
         # Configuration/runtime validation issues (e.g., missing API key)
         print(f"[get_response] ValueError for user_id={user_id}: {e}")
@@ -434,21 +598,27 @@ def end_chat():
         return jsonify({"error": "No active session found."}), 403
 
     try:
-        # Save latest file-based history snapshot.
-        previous_chat_history = chatbot.load_chat_history(user_id)
-        chatbot.save_chat_history(user_id, previous_chat_history)
-        chatbot.clear_memory(user_id)
+        # Every turn is already persisted to the message store, so there is nothing to re-save here.
+        get_chatbot().clear_memory(user_id)
 
         # Run recommendation pipeline immediately after ending chat.
         chat_file = get_chat_file(user_id)
-        if os.path.exists(chat_file):
-            counselor_ai.generate_recommendation(chat_file, user_id)
+        if message_store.has_messages(user_id) or os.path.exists(chat_file):
+            try:
+                get_counselor_ai().generate_recommendation(chat_file, user_id, session_id=session.get("session_id"))
+            except LLMUnavailable as e:
+                # Still run the suicide analysis below; the recommendation is generated on the next visit.
+                print(f"[end_chat] Recommendation deferred for user_id={user_id}: {e}")
         else:
-            print(f"[end_chat] Chat history file not found for user_id={user_id}: {chat_file}")
+            print(f"[end_chat] No chat history found for user_id={user_id}: {chat_file}")
 
         # Analyze saved chat with suicide detector and send email if triggered.
         analyze_suicide_and_notify(user_id)
 
+        # Messages after this point belong to a new conversation; the closed one can be archived.
+        chat_archive.mark_closed(user_id)
+        session['session_id'] = str(uuid.uuid4())
+
         return jsonify({
             "message": "Chat ended and recommendation generated.",
             "redirect_url": url_for("recommendation")
@@ -464,6 +634,12 @@ def logout():
     flash("You have been logged out successfully.", "info")
     return redirect(url_for('login'))
 
+# The schema is idempotent, so every worker creates it at import, however the app was started.
+init_db()
+
+_import_seconds = time.perf_counter() - _import_started
+components.record("app.import", _import_seconds)
+print(f"[startup] app imported in {_import_seconds:.2f}s (heavy components deferred)")
+
 if __name__ == '__main__':
-    init_db()
     app.run(debug=True)
@@ -0,0 +1,171 @@
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import uuid
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+MANIFEST_NAME = "manifest.json"
+HASHED_NAME = re.compile(r"\.(?P<digest>[0-9a-f]{10})\.[a-z]+$")
+SOURCE_EXTENSIONS = {".css", ".js", ".svg"}
+# Hashed names change with their content, so browsers and CDNs may keep them forever.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Pre-compressed variants in order of preference.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+# Hand-rolled JS/CSS minifiers get string and regex literals wrong, so without rjsmin/rcssmin
+# those files are hashed and compressed unchanged.
+def minify_js(source):
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+    return source
+
+
+def minify_css(source):
+    if rcssmin is not None:
+        return rcssmin.cssmin(source)
+    return source
+
+
+def minify_svg(source):
+    source = re.sub(r"<!--.*?-->", "", source, flags=re.S)
+    return re.sub(r">\s+<", "><", source).strip()
+
+
+MINIFIERS = {".js": minify_js, ".css": minify_css, ".svg": minify_svg}
+
+
+def iter_sources(static_dir, build_dir):
+    build_dir = os.path.abspath(build_dir)
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != build_dir)
+        for name in sorted(files):
+            if os.path.splitext(name)[1] in SOURCE_EXTENSIONS:
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, static_dir).replace(os.sep, "/"), path
+
+
+def _write(path, data):
+    # Workers may build at the same time; each writes its own temp file and the last rename wins.
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build(static_dir, build_dir):
+    """
+    Minify every CSS/JS/SVG file under `static_dir` (CSS and JS only when rcssmin/rjsmin are
+    installed; otherwise they are copied as-is), write it to `build_dir` under a
+    content-hashed name (css/style.3f2a9c1b04.css) with .gz and, when brotli is installed,
+    .br variants, and record logical name -> hashed name in manifest.json.
+    """
+    manifest = {}
+    for logical, path in iter_sources(static_dir, build_dir):
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+        ext = os.path.splitext(logical)[1]
+        data = MINIFIERS[ext](source).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()[:10]
+        hashed = f"{logical[:-len(ext)]}.{digest}{ext}"
+
+        target = os.path.join(build_dir, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not os.path.exists(target):
+            _write(target, data)
+            _write(f"{target}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write(f"{target}.br", brotli.compress(data, quality=11))
+        manifest[logical] = {"path": hashed, "etag": digest, "bytes": len(data), "source_bytes": len(source.encode("utf-8"))}
+
+    # Earlier builds are kept so pages rendered before a deploy can still fetch their assets.
+    _write(os.path.join(build_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    print(f"[assets] Built {len(manifest)} assets into {build_dir}")
+    return manifest
+
+
+def is_stale(static_dir, build_dir):
+    manifest_path = os.path.join(build_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return True
+    built_at = os.path.getmtime(manifest_path)
+    return any(os.path.getmtime(path) > built_at for _, path in iter_sources(static_dir, build_dir))
+
+
+class AssetManifest:
+    def __init__(self, static_dir, build_dir, auto_build=True):
+        """
+        Maps logical static paths to their hashed build output. With `auto_build`, the build runs
+        when the manifest is missing or older than a source file; if it cannot (e.g. a read-only
+        filesystem), lookups fall back to the unhashed files.
+        """
+        self.static_dir = static_dir
+        self.build_dir = build_dir
+        self.entries = {}
+        if auto_build:
+            try:
+                if is_stale(static_dir, build_dir):
+                    build(static_dir, build_dir)
+            except OSError as e:
+                print(f"[assets] Build skipped, serving unhashed assets: {e}")
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.build_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        return self
+
+    def hashed_path(self, logical):
+        entry = self.entries.get(logical)
+        return entry["path"] if entry else None
+
+    def resolve(self, filename, accept_encoding=""):
+        """
+        Pick the file to send for a hashed asset request: (path, content_encoding, etag),
+        or None when `filename` is not a current or previous build output.
+        """
+        match = HASHED_NAME.search(filename)
+        target = os.path.abspath(os.path.join(self.build_dir, filename))
+        if not match or not target.startswith(os.path.abspath(self.build_dir) + os.sep) or not os.path.isfile(target):
+            return None
+        digest = match.group("digest")
+        accepted = {token.split(";")[0].strip() for token in accept_encoding.lower().split(",")}
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and os.path.exists(target + suffix):
+                return target + suffix, encoding, f"{digest}-{encoding}"
+        return target, None, digest
+
+    @staticmethod
+    def mimetype(filename):
+        return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Minify, content-hash and pre-compress static assets.")
+    parser.add_argument("--static-dir", default="./static")
+    parser.add_argument("--build-dir", default="./static/dist")
+    args = parser.parse_args()
+
+    for logical, entry in sorted(build(args.static_dir, args.build_dir).items()):
+        print(f"[assets] {logical} -> {entry['path']} ({entry['source_bytes']} -> {entry['bytes']} bytes)")
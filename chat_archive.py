@@ -0,0 +1,218 @@
+import gzip
+import io
+import json
+import threading
+import time
+import uuid
+
+import chat_log
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+class ArchiveSegmentMissing(Exception):
+    """An archive segment listed in a user's index could not be read."""
+
+
+def _decompress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ChatArchive:
+    def __init__(self, storage, chat_prefix="chat_logs", archive_prefix="chat_archive"):
+        """
+        Rolls closed conversations out of the hot chat log into compressed archive segments.
+
+        Per user, under `archive_prefix/<userid>/`:
+          - closed.json: byte offsets in the hot log where conversations were closed, with timestamps
+          - index.json: archived segments with their logical offsets, message counts and close times
+          - seg_NNNNNN_<id>.txt.zst / .gz: the archived bytes, in the normal `You:`/`AI:` format
+        Logical offsets count from the start of the user's whole history, so the hot log starts
+        at index["hot_base_offset"].
+
+        Compaction, mark_closed() and every append to the hot log hold the storage lock for the
+        hot log's key, so any number of workers and nodes may compact at once. Segments get
+        unique names and are never rewritten or deleted once written.
+        """
+        self.chat_storage = storage.scoped(chat_prefix)
+        self.archive_storage = storage.scoped(archive_prefix)
+        self.codec = "zstd" if zstandard is not None else "gzip"
+
+    @staticmethod
+    def hot_key(user_id):
+        return f"chat_history_{user_id}.txt"
+
+    def _read_json(self, key, default):
+        data = self.archive_storage.read(key)
+        return json.loads(data) if data else default
+
+    def _write_json(self, key, value):
+        self.archive_storage.write(key, json.dumps(value).encode("utf-8"))
+
+    def read_index(self, user_id):
+        return self._read_json(f"{user_id}/index.json", {"segments": [], "hot_base_offset": 0})
+
+    def _finish_pending(self, user_id):
+        """
+        Complete a compaction that stopped after indexing its segment but before trimming the
+        hot log. Returns the index. The caller holds the hot log's lock.
+        """
+        index = self.read_index(user_id)
+        pending = index.get("pending_trim")
+        if pending is None:
+            return index
+        key = self.hot_key(user_id)
+        stat = self.chat_storage.stat(key)
+        # Appends keep the generation; a new one means the trim itself was already written.
+        if stat is not None and str(stat[0]) == pending["generation"]:
+            self.chat_storage.write(key, self.chat_storage.read(key)[pending["cut"]:])
+        self._write_json(f"{user_id}/closed.json", pending["closed"])
+        del index["pending_trim"]
+        self._write_json(f"{user_id}/index.json", index)
+        return index
+
+    def mark_closed(self, user_id):
+        """Record that everything currently in the hot log belongs to a finished conversation."""
+        with self.chat_storage.lock(self.hot_key(user_id)):
+            self._finish_pending(user_id)
+            stat = self.chat_storage.stat(self.hot_key(user_id))
+            if stat is None:
+                return
+            closed = self._read_json(f"{user_id}/closed.json", [])
+            if closed and closed[-1]["offset"] >= stat[1]:
+                return
+            closed.append({"offset": stat[1], "closed_at": time.time()})
+            self._write_json(f"{user_id}/closed.json", closed)
+
+    def compact(self, user_id):
+        """
+        Move the closed part of the user's hot log into a new archive segment.
+        Returns the new index entry, or None if there was nothing to archive.
+        """
+        with self.chat_storage.lock(self.hot_key(user_id)):
+            return self._compact_locked(user_id)
+
+    def _compact_locked(self, user_id):
+        index = self._finish_pending(user_id)
+        closed = self._read_json(f"{user_id}/closed.json", [])
+        if not closed:
+            return None
+
+        key = self.hot_key(user_id)
+        stat = self.chat_storage.stat(key)
+        data = self.chat_storage.read(key)
+        if stat is None or data is None:
+            return None
+
+        # Offsets recorded before the log was last rewritten no longer apply.
+        cut = max((c["offset"] for c in closed if c["offset"] <= len(data)), default=0)
+        if cut == 0:
+            return None
+
+        base = index["hot_base_offset"]
+        archived = data[:cut]
+        name = f"seg_{len(index['segments']):06d}_{uuid.uuid4().hex[:8]}.txt.{'zst' if self.codec == 'zstd' else 'gz'}"
+        stored = _compress(archived, self.codec)
+        self.archive_storage.write(f"{user_id}/{name}", stored)
+
+        entry = {
+            "name": name,
+            "codec": self.codec,
+            "start_offset": base,
+            "end_offset": base + cut,
+            "raw_bytes": cut,
+            "stored_bytes": len(stored),
+            "messages": sum(1 for _ in chat_log.iter_stream(io.BytesIO(archived))),
+            "sessions": [{"end_offset": base + c["offset"], "closed_at": c["closed_at"]}
+                         for c in closed if c["offset"] <= cut],
+            "archived_at": time.time(),
+        }
+        index["segments"].append(entry)
+        index["hot_base_offset"] = base + cut
+        # The segment is indexed before the hot log is trimmed; if we stop in between,
+        # the next holder of the lock finishes the trim from this record.
+        index["pending_trim"] = {
+            "cut": cut,
+            "generation": str(stat[0]),
+            "closed": [{"offset": c["offset"] - cut, "closed_at": c["closed_at"]} for c in closed if c["offset"] > cut],
+        }
+        self._write_json(f"{user_id}/index.json", index)
+        self._finish_pending(user_id)
+
+        print(f"[chat_archive] user_id={user_id}: archived {cut} bytes as {name} ({len(stored)} bytes {self.codec})")
+        return entry
+
+    def _snapshot(self, user_id):
+        """The index and an open handle on the hot log (or None), taken together under the lock."""
+        key = self.hot_key(user_id)
+        with self.chat_storage.lock(key):
+            index = self._finish_pending(user_id)
+            try:
+                # Writers replace the file rather than truncate it, so this handle keeps the snapshot.
+                hot = open(self.chat_storage.local_path(key), "rb")
+            except FileNotFoundError:
+                hot = None
+        return index, hot
+
+    def iter_messages(self, user_id, include_archive=False, since=None):
+        """
+        Stream the user's history. The hot log alone covers the active conversation; archive
+        segments are only fetched and decompressed when `include_archive` is set. With `since`
+        (a unix timestamp), segments whose conversations all closed before it are skipped.
+        Raises ArchiveSegmentMissing if an indexed segment cannot be read.
+        """
+        index, hot = self._snapshot(user_id)
+        try:
+            if include_archive:
+                for entry in index["segments"]:
+                    if since is not None and entry["sessions"] and entry["sessions"][-1]["closed_at"] < since:
+                        continue
+                    stored = self.archive_storage.read(f"{user_id}/{entry['name']}")
+                    if stored is None:
+                        raise ArchiveSegmentMissing(f"Archive segment {entry['name']} for user_id={user_id} is missing")
+                    raw = _decompress(stored, entry["codec"])
+                    yield from chat_log.iter_stream(io.BytesIO(raw), entry["start_offset"])
+
+            if hot is not None:
+                yield from chat_log.iter_stream(hot, index["hot_base_offset"])
+        finally:
+            if hot is not None:
+                hot.close()
+
+    def compact_all(self, before_compact=None):
+        """Compact every user with closed conversations. `before_compact(user_id)` runs first for each."""
+        users = sorted({key.split("/", 1)[0] for key in self.archive_storage.list() if key.endswith("/closed.json")})
+        compacted = 0
+        for user_id in users:
+            try:
+                if before_compact is not None:
+                    before_compact(user_id)
+                if self.compact(user_id):
+                    compacted += 1
+            except Exception as e:
+                print(f"[chat_archive] Compaction failed for user_id={user_id}: {e}")
+        return compacted
+
+    def start_compaction(self, interval, before_compact=None):
+        """Run compact_all() every `interval` seconds in a daemon thread."""
+        def _loop():
+            while True:
+                time.sleep(interval)
+                count = self.compact_all(before_compact)
+                if count:
+                    print(f"[chat_archive] Background compaction archived {count} chat logs")
+
+        thread = threading.Thread(target=_loop, name="chat-compaction", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,112 @@
+import os
+from typing import NamedTuple
+
+USER = "user"
+AI = "ai"
+
+# Line prefixes written by CounselorChatbot.append_chat_history.
+PREFIXES = {
+    USER: b"You:",
+    AI: b"AI:",
+}
+
+
+class ChatMessage(NamedTuple):
+    role: str
+    text: str
+    offset: int  # byte offset of the message's first line
+    end: int  # byte offset just past the message's last line
+
+
+def _match_prefix(line):
+    for role, prefix in PREFIXES.items():
+        if line.startswith(prefix):
+            return role, len(prefix)
+    return None, 0
+
+
+def _build(role, parts, offset, end):
+    # Only the kept slices are decoded; prefixes and skipped lines never leave bytes.
+    text = b"".join(parts).decode("utf-8", errors="ignore").strip()
+    return ChatMessage(role, text, offset, end)
+
+
+def iter_stream(f, position=0):
+    """
+    Parse messages from a binary file object, reading from its current position.
+    `position` is the offset reported for that point (e.g. a logical offset across archive segments).
+
+    Lines without a known prefix continue the previous message (multi-line AI replies).
+    A trailing line with no newline is treated as still being written and is not yielded.
+    """
+    role, parts, msg_offset = None, [], position
+
+    for line in f:
+        if not line.endswith(b"\n"):
+            break
+        line_start = position
+        position += len(line)
+
+        new_role, prefix_len = _match_prefix(line)
+        if new_role is not None:
+            if role is not None:
+                yield _build(role, parts, msg_offset, line_start)
+            role, parts, msg_offset = new_role, [line[prefix_len:]], line_start
+        elif role is not None:
+            parts.append(line)
+
+    if role is not None:
+        yield _build(role, parts, msg_offset, position)
+
+
+def iter_messages(path, start_offset=0):
+    """Stream messages from a chat log file starting at `start_offset` bytes."""
+    if not os.path.exists(path):
+        return
+
+    with open(path, "rb") as f:
+        f.seek(start_offset)
+        yield from iter_stream(f, start_offset)
+
+
+def read_messages(path, start_offset=0):
+    """Return (messages, end_offset); pass end_offset back in to read only what was appended since."""
+    messages = list(iter_messages(path, start_offset))
+    end_offset = messages[-1].end if messages else start_offset
+    return messages, end_offset
+
+
+def format_message(role, text):
+    return f"{PREFIXES[role].decode()} {text}\n"
+
+
+def encode_messages(messages):
+    """Serialize (role, text) pairs to the bytes written to a log."""
+    return "".join(format_message(role, text) for role, text in messages).encode("utf-8")
+
+
+class ChatLogTail:
+    def __init__(self, path):
+        """Follows one chat log, reading only the bytes appended since the last refresh."""
+        self.path = path
+        self.offset = 0
+        self.messages = []
+        self._inode = None
+
+    def refresh(self):
+        try:
+            st = os.stat(self.path)
+            size, inode = st.st_size, st.st_ino
+        except OSError:
+            size, inode = 0, None
+
+        # The file was replaced, truncated or rewritten shorter: start over.
+        if inode != self._inode or size < self.offset:
+            self.offset = 0
+            self.messages = []
+            self._inode = inode
+
+        if size > self.offset:
+            new_messages, self.offset = read_messages(self.path, self.offset)
+            self.messages.extend(new_messages)
+        return self.messages
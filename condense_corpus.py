@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import time
+import uuid
+
+import faiss
+import numpy as np
+import pandas as pd
+
+import chat_log
+from corpus_index import CorpusIndex
+
+# Above this many vectors the neighbour graph is built with an IVF index instead of brute force.
+EXACT_KNN_LIMIT = 100_000
+
+
+def normalized(embeddings):
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32).copy()
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def knn(vectors, k, exact=False, batch_size=8192):
+    """Cosine k-nearest neighbours of every vector against the whole set: (similarities, ids)."""
+    n, dimension = vectors.shape
+    if exact or n <= EXACT_KNN_LIMIT:
+        index = faiss.IndexFlatIP(dimension)
+    else:
+        nlist = int(4 * np.sqrt(n))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dimension), dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        sample = vectors[np.random.default_rng(0).choice(n, min(n, nlist * 64), replace=False)]
+        index.train(sample)
+        index.nprobe = 16
+    index.add(vectors)
+
+    sims = np.empty((n, k), dtype=np.float32)
+    ids = np.empty((n, k), dtype=np.int64)
+    started = time.perf_counter()
+    for start in range(0, n, batch_size):
+        sims[start:start + batch_size], ids[start:start + batch_size] = index.search(vectors[start:start + batch_size], k)
+        if start and start % (batch_size * 16) == 0:
+            print(f"[condense] Neighbour graph: {start}/{n} ({time.perf_counter() - started:.0f}s)")
+    return sims, ids
+
+
+def near_duplicates(codes, sims, ids, threshold, alive):
+    """
+    Greedy near-duplicate removal: walk the corpus in order and drop a point when an already
+    kept neighbour with the same label is at least `threshold` cosine-similar.
+    """
+    n = len(codes)
+    own = np.arange(n)[:, None]
+    valid = (ids >= 0) & (ids != own)
+    same = valid & (codes[np.where(valid, ids, 0)] == codes[:, None]) & (sims >= threshold)
+
+    kept = np.zeros(n, dtype=bool)
+    for i in range(n):
+        if not alive[i]:
+            continue
+        candidates = ids[i][same[i]]
+        if candidates.size == 0 or not kept[candidates].any():
+            kept[i] = True
+    return kept
+
+
+def boundary_points(codes, ids, k):
+    """Points with at least one of their k nearest neighbours carrying a different label."""
+    neighbours = ids[:, :k + 1]
+    valid = (neighbours >= 0) & (neighbours != np.arange(len(codes))[:, None])
+    other = codes[np.where(valid, neighbours, 0)] != codes[:, None]
+    return (valid & other).any(axis=1)
+
+
+def condense(texts, labels, embeddings, dup_threshold=0.97, boundary_k=10, interior_keep=0.1, exact=False, seed=0):
+    """
+    Return (indices to keep, stats). Exact text duplicates and same-label near-duplicates are
+    removed; of the rest, every point near a class boundary is kept and only `interior_keep`
+    of the points deep inside a single-label region are.
+    """
+    codes = pd.factorize(labels)[0]
+    exact_dup = pd.DataFrame({"text": texts, "label": labels}).duplicated(keep="first").to_numpy()
+
+    sims, ids = knn(normalized(embeddings), boundary_k + 1, exact=exact)
+    deduped = near_duplicates(codes, sims, ids, dup_threshold, ~exact_dup)
+    boundary = boundary_points(codes, ids, boundary_k)
+    sampled = np.random.default_rng(seed).random(len(codes)) < interior_keep
+    keep = deduped & (boundary | sampled)
+
+    stats = {
+        "input_rows": int(len(codes)),
+        "exact_duplicates": int(exact_dup.sum()),
+        "near_duplicates": int((~exact_dup & ~deduped).sum()),
+        "boundary_rows": int((deduped & boundary).sum()),
+        "interior_rows_kept": int((deduped & ~boundary & sampled).sum()),
+        "interior_rows_dropped": int((deduped & ~boundary & ~sampled).sum()),
+        "output_rows": int(keep.sum()),
+    }
+    return np.flatnonzero(keep), stats
+
+
+def nearest_labels(corpus_embeddings, corpus_labels, queries):
+    """Top-1 labels the classifier would assign with this corpus, and the search time."""
+    index = faiss.IndexFlatL2(corpus_embeddings.shape[1])
+    index.add(np.ascontiguousarray(corpus_embeddings, dtype=np.float32))
+    started = time.perf_counter()
+    _, ids = index.search(np.ascontiguousarray(queries, dtype=np.float32), 1)
+    return corpus_labels[ids[:, 0]], time.perf_counter() - started
+
+
+def compare(full, condensed, queries, true_labels=None):
+    full_labels, full_seconds = nearest_labels(*full, queries)
+    condensed_labels, condensed_seconds = nearest_labels(*condensed, queries)
+    result = {
+        "queries": int(len(queries)),
+        "label_agreement": float((full_labels == condensed_labels).mean()) if len(queries) else None,
+        "full_search_seconds": round(full_seconds, 4),
+        "condensed_search_seconds": round(condensed_seconds, 4),
+    }
+    if true_labels is not None and len(queries):
+        result["full_accuracy"] = float((full_labels == true_labels).mean())
+        result["condensed_accuracy"] = float((condensed_labels == true_labels).mean())
+    return result
+
+
+def encode_chat_messages(db_path, limit, model_name):
+    """Embed a random sample of stored user messages, or return None when that is not possible."""
+    if not db_path or not os.path.exists(db_path) or limit <= 0:
+        return None
+    from message_store import MessageStore
+    texts = [row.text for row in MessageStore(db_path).sample_messages(role=chat_log.USER, limit=limit)]
+    if not texts:
+        return None
+
+    from model_client import get_model_client
+    client = get_model_client()
+    if client is not None:
+        return client.encode(texts)
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("[condense] sentence-transformers not installed; skipping chat evaluation")
+        return None
+    return SentenceTransformer(model_name).encode(texts, convert_to_numpy=True, show_progress_bar=False)
+
+
+def run(corpus, dup_threshold=0.97, boundary_k=10, interior_keep=0.1, holdout=0.01, float16=False, exact=False,
+        db_path=None, chat_sample=2000, model_name='all-MiniLM-L6-v2', output_dir=None, install=False, seed=0):
+    manifest = corpus._read_manifest()
+    base = manifest["base"]
+    df = pd.read_csv(corpus._resolve(base["dataset"]))
+    embeddings = np.load(corpus._resolve(base["embeddings"]))
+    if len(df) != len(embeddings):
+        raise ValueError(f"Dataset has {len(df)} rows but embeddings has {len(embeddings)}.")
+    labels = df["label"].astype(str).to_numpy()
+    print(f"[condense] Base generation {manifest['generation']}: {len(df)} rows, {embeddings.dtype} embeddings")
+
+    # Held-out rows are left out of condensation so agreement is measured on unseen points;
+    # they are written back unchanged so no labelled data is lost.
+    order = np.random.default_rng(seed).permutation(len(df))
+    held_out = np.sort(order[:int(len(df) * holdout)])
+    working = np.sort(order[int(len(df) * holdout):])
+
+    kept, stats = condense(df["text"].astype(str).to_numpy()[working], labels[working], embeddings[working],
+                           dup_threshold, boundary_k, interior_keep, exact=exact, seed=seed)
+    kept = working[kept]
+    output = np.sort(np.concatenate([kept, held_out]))
+
+    report = {"generation": manifest["generation"], "condensation": stats, "held_out_rows": int(len(held_out))}
+    if len(held_out):
+        report["held_out_corpus"] = compare((embeddings[working], labels[working]), (embeddings[kept], labels[kept]),
+                                            embeddings[held_out], labels[held_out])
+    chat_queries = encode_chat_messages(db_path, chat_sample, model_name)
+    if chat_queries is not None:
+        report["held_out_chats"] = compare((embeddings, labels), (embeddings[output], labels[output]), chat_queries)
+
+    out_embeddings = embeddings[output].astype(np.float16 if float16 else np.float32)
+    out_df = df.iloc[output][["text", "label"]]
+
+    output_dir = output_dir or corpus.segments_dir
+    os.makedirs(output_dir, exist_ok=True)
+    # Installed files are renamed into place by install_base(), so give them a collision-free name.
+    name = f"condensed_{uuid.uuid4().hex[:8]}" if install else "condensed"
+    dataset_path = os.path.join(output_dir, f"{name}.csv")
+    embeddings_path = os.path.join(output_dir, f"{name}.npy")
+    out_df.to_csv(dataset_path, index=False)
+    np.save(embeddings_path, out_embeddings)
+
+    report["size"] = {
+        "rows_before": int(len(df)),
+        "rows_after": int(len(output)),
+        "row_reduction": round(1 - len(output) / len(df), 4) if len(df) else 0,
+        "embedding_bytes_before": int(embeddings.nbytes),
+        "embedding_bytes_after": int(out_embeddings.nbytes),
+        "dataset_bytes_before": os.path.getsize(corpus._resolve(base["dataset"])),
+        "dataset_bytes_after": os.path.getsize(dataset_path),
+        "embedding_dtype": str(out_embeddings.dtype),
+    }
+    if install:
+        report["installed"] = corpus.install_base(dataset_path, embeddings_path, manifest["generation"])
+    else:
+        report["output"] = {"dataset": dataset_path, "embeddings": embeddings_path}
+    return report
+
+
+def print_report(report):
+    size = report["size"]
+    print(f"[condense] Rows: {size['rows_before']} -> {size['rows_after']} "
+          f"({size['row_reduction'] * 100:.1f}% smaller); embeddings {size['embedding_bytes_before'] / 1e6:.1f} MB -> "
+          f"{size['embedding_bytes_after'] / 1e6:.1f} MB ({size['embedding_dtype']})")
+    print(f"[condense] Removed {report['condensation']['exact_duplicates']} exact and "
+          f"{report['condensation']['near_duplicates']} near duplicates, "
+          f"{report['condensation']['interior_rows_dropped']} interior points")
+    for name in ("held_out_corpus", "held_out_chats"):
+        if name in report:
+            result = report[name]
+            line = f"[condense] {name}: {result['queries']} queries, agreement={result['label_agreement']:.4f}"
+            if "full_accuracy" in result:
+                line += f", accuracy full={result['full_accuracy']:.4f} condensed={result['condensed_accuracy']:.4f}"
+            print(line + f", search {result['full_search_seconds']}s -> {result['condensed_search_seconds']}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deduplicate and condense the reference corpus.")
+    parser.add_argument("--dataset", default='./model/balanced_cleaned_dataset.csv')
+    parser.add_argument("--embeddings", default='./model/embeddings.npy')
+    parser.add_argument("--model", default='all-MiniLM-L6-v2', help="Encoder for the held-out chat messages.")
+    parser.add_argument("--dup-threshold", type=float, default=0.97, help="Cosine similarity for near-duplicates.")
+    parser.add_argument("--boundary-k", type=int, default=10, help="Neighbours checked for a different label.")
+    parser.add_argument("--interior-keep", type=float, default=0.1, help="Fraction of interior points kept.")
+    parser.add_argument("--holdout", type=float, default=0.01, help="Fraction of rows held out for evaluation.")
+    parser.add_argument("--float16", action="store_true", help="Store the condensed embeddings as float16.")
+    parser.add_argument("--exact", action="store_true", help="Brute-force neighbour graph even for large corpora.")
+    parser.add_argument("--db", default='./users.db', help="Database to sample held-out chat messages from.")
+    parser.add_argument("--chat-sample", type=int, default=2000)
+    parser.add_argument("--output-dir", default=None, help="Where to write condensed.csv/.npy (default: segments dir).")
+    parser.add_argument("--install", action="store_true", help="Install the result as the corpus base segment.")
+    parser.add_argument("--report", default=None, help="Also write the report as JSON to this path.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = run(CorpusIndex(args.dataset, args.embeddings), dup_threshold=args.dup_threshold,
+                 boundary_k=args.boundary_k, interior_keep=args.interior_keep, holdout=args.holdout,
+                 float16=args.float16, exact=args.exact, db_path=args.db, chat_sample=args.chat_sample,
+                 model_name=args.model, output_dir=args.output_dir, install=args.install, seed=args.seed)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -1,18 +1,29 @@
 import os
+from collections import OrderedDict
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+import chat_log
+from llm_gateway import get_llm_gateway
+from message_store import DEFAULT_SESSION
+from storage import LocalStorage
 
 
 class CounselorChatbot:
-    def __init__(self, model_name="llama-3.1-8b-instant", chat_directory="chat_logs"):
-        """Initialize the AI chatbot with file-based chat history."""
+    def __init__(self, model_name="llama-3.1-8b-instant", chat_directory="chat_logs", message_store=None,
+                 history_limit=40, storage=None, gateway=None, archive=None):
+        """
+        Initialize the AI chatbot. With a MessageStore, context is the last `history_limit` messages
+        read from the database; without one, it falls back to file-based chat history, read through
+        `archive` (a ChatArchive) when given so conversations compacted out of the log still count.
+        Transcripts go to `storage` (a StorageBackend), defaulting to files in `chat_directory`.
+        """
         # Load environment variables
         load_dotenv()
         self.api_key = os.getenv("CHAT_GROQ_API_KEY")
 
-        # Initialize ChatGroq model
-        self.chat_groq = ChatGroq(model_name=model_name, api_key=self.api_key)
+        # Shared ChatGroq client; every call goes through the process-wide LLM gateway
+        self.gateway = gateway or get_llm_gateway()
+        self.chat_groq = self.gateway.client(model_name, self.api_key)
 
         # System prompt defining the AI's role
         self.system_prompt = SystemMessage(
@@ -24,38 +35,82 @@ class CounselorChatbot:
         # Directory for storing chat logs
         self.chat_directory = chat_directory
         os.makedirs(self.chat_directory, exist_ok=True)
+        self.storage = storage or LocalStorage(chat_directory)
+
+        # Per-user tails of the chat log so each turn only parses newly appended lines.
+        self._tails = OrderedDict()
+        self.max_cached_users = 256
+
+        self.message_store = message_store
+        self.history_limit = history_limit
+        self.archive = archive
+
+    @staticmethod
+    def get_chat_history_key(user_id):
+        return f"chat_history_{user_id}.txt"
 
     def get_chat_history_path(self, user_id):
-        """Generate the chat history file path for a given user."""
-        return os.path.join(self.chat_directory, f"chat_history_{user_id}.txt")
+        """Local path of the user's chat history, refreshed from shared storage if needed."""
+        return self.storage.local_path(self.get_chat_history_key(user_id))
+
+    def _get_tail(self, user_id):
+        path = self.get_chat_history_path(user_id)
+        tail = self._tails.pop(user_id, None)
+        if tail is None:
+            tail = chat_log.ChatLogTail(path)
+        self._tails[user_id] = tail
+        while len(self._tails) > self.max_cached_users:
+            self._tails.popitem(last=False)
+        return tail
 
     def load_chat_history(self, user_id):
-        """Load previous chat history from a file if available."""
-        chat_history_file = self.get_chat_history_path(user_id)
-        messages = []
+        """Load the recent chat history from the message store, or from the file if there is no store."""
+        if self.message_store is not None:
+            self.message_store.ensure_imported(user_id, self.get_chat_history_path(user_id))
+            history = self.message_store.recent_messages(user_id, self.history_limit)
+        else:
+            history = self._get_tail(user_id).refresh()
+            # The hot log only holds the open conversation; older turns are in archive segments.
+            if len(history) < self.history_limit and self.archive is not None and self.archive.read_index(user_id)["segments"]:
+                history = list(self.archive.iter_messages(user_id, include_archive=True))
+            history = history[-self.history_limit:]
 
-        if os.path.exists(chat_history_file):
-            with open(chat_history_file, "r", encoding="utf-8") as file:
-                lines = file.readlines()
-                for line in lines:
-                    if line.startswith("You:"):
-                        messages.append(HumanMessage(content=line.replace("You:", "").strip()))
-                    elif line.startswith("AI:"):
-                        messages.append(AIMessage(content=line.replace("AI:", "").strip()))
+        messages = []
+        for message in history:
+            if message.role == chat_log.USER:
+                messages.append(HumanMessage(content=message.text))
+            else:
+                messages.append(AIMessage(content=message.text))
         return messages
 
+    @staticmethod
+    def _to_log_entries(chat_history):
+        entries = []
+        for message in chat_history:
+            if isinstance(message, HumanMessage):
+                entries.append((chat_log.USER, message.content))
+            elif isinstance(message, AIMessage):
+                entries.append((chat_log.AI, message.content))
+        return entries
+
     def save_chat_history(self, user_id, chat_history):
         """Save the chat history to a text file."""
-        chat_history_file = self.get_chat_history_path(user_id)
-
-        with open(chat_history_file, "w", encoding="utf-8") as file:
-            for message in chat_history:
-                if isinstance(message, HumanMessage):
-                    file.write(f"You: {message.content}\n")
-                elif isinstance(message, AIMessage):
-                    file.write(f"AI: {message.content}\n")
-
-    def chat(self, user_id, user_input):
+        payload = chat_log.encode_messages(self._to_log_entries(chat_history))
+        key = self.get_chat_history_key(user_id)
+        with self.storage.lock(key):
+            self.storage.write(key, payload)
+
+    def append_chat_history(self, user_id, new_messages, session_id=None):
+        """Append only the new turn. The text file is kept as a plain transcript next to the store."""
+        entries = self._to_log_entries(new_messages)
+        if self.message_store is not None:
+            self.message_store.append(user_id, session_id or DEFAULT_SESSION, entries)
+        # Held so a concurrent ChatArchive.compact() cannot trim the log around this append.
+        key = self.get_chat_history_key(user_id)
+        with self.storage.lock(key):
+            self.storage.append(key, chat_log.encode_messages(entries))
+
+    def chat(self, user_id, user_input, session_id=None):
         """Generate AI response for the given user input and update chat history."""
         previous_chat_history = self.load_chat_history(user_id)
 
@@ -63,18 +118,18 @@ class CounselorChatbot:
             raise ValueError("CHAT_GROQ_API_KEY is missing in environment variables.")
 
         messages = [self.system_prompt] + previous_chat_history + [HumanMessage(content=user_input)]
-        response = self.chat_groq.invoke(messages)
+        response = self.gateway.invoke(self.chat_groq, messages)
         ai_response = response.content if hasattr(response, "content") else str(response)
 
-        # Update and save chat history
-        previous_chat_history.append(HumanMessage(content=user_input))
-        previous_chat_history.append(AIMessage(content=ai_response))
-        self.save_chat_history(user_id, previous_chat_history)
+        # Append the new turn to the chat history
+        self.append_chat_history(
+            user_id, [HumanMessage(content=user_input), AIMessage(content=ai_response)], session_id=session_id
+        )
 
         return ai_response
 
     def clear_memory(self, user_id):
-        """No-op for compatibility. Chat history is file-based."""
+        """No-op for compatibility. Chat history is persisted on every turn."""
         return None
 
 
@@ -0,0 +1,323 @@
+import argparse
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+import pandas as pd
+
+MANIFEST_NAME = "manifest.json"
+
+
+class CorpusIndex:
+    def __init__(self, dataset_path, embeddings_path, segments_dir=None):
+        """
+        Reference corpus for RAGSimilarityClassifier: a base segment (dataset CSV + embeddings.npy)
+        plus append-only delta segments listed in `segments_dir/manifest.json`.
+
+        Deltas are added to the live FAISS index as they appear, so labelled examples can be
+        appended without rebuilding; compact() later folds them into a new base segment.
+        """
+        self.root_dataset_path = dataset_path
+        self.root_embeddings_path = embeddings_path
+        self.segments_dir = segments_dir or os.path.join(os.path.dirname(embeddings_path) or ".", "corpus_segments")
+        self.manifest_path = os.path.join(self.segments_dir, MANIFEST_NAME)
+
+        self.labels = []
+        self.index = None
+        self.base = None
+        self.applied_segments = set()
+        self._root = None
+        self._manifest_stamp = None
+        self._lock = threading.RLock()
+
+    def _default_manifest(self):
+        return {
+            "root": [self.root_dataset_path, self.root_embeddings_path],
+            "generation": 0,
+            "base": {"dataset": self.root_dataset_path, "embeddings": self.root_embeddings_path, "folded": []},
+            "segments": [],
+        }
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return self._default_manifest()
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.segments_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def version(self):
+        """Identifies the corpus content: changes when a segment is appended or the base is rewritten."""
+        manifest = self._read_manifest()
+        return {"generation": manifest["generation"], "epoch": manifest["base"].get("epoch", 0),
+                "segments": list(manifest["segments"])}
+
+    @contextmanager
+    def _manifest_lock(self):
+        """Cross-process lock for manifest read-modify-write."""
+        os.makedirs(self.segments_dir, exist_ok=True)
+        with open(os.path.join(self.segments_dir, "manifest.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.manifest_path)
+            return st.st_mtime_ns, st.st_size, st.st_ino
+        except FileNotFoundError:
+            return None
+
+    def _resolve(self, name):
+        # Files the manifest generates are bare names inside segments_dir; the root paths are used as given.
+        if name in (self.root_dataset_path, self.root_embeddings_path) or os.path.isabs(name) or os.path.dirname(name):
+            return name
+        return os.path.join(self.segments_dir, name)
+
+    @staticmethod
+    def _load_embeddings(path):
+        # Stored embeddings may be float16 on disk; FAISS needs float32.
+        return np.ascontiguousarray(np.load(path), dtype=np.float32)
+
+    def _load_segment(self, name):
+        with np.load(self._resolve(name), allow_pickle=False) as data:
+            return np.ascontiguousarray(data["embeddings"], dtype=np.float32), data["labels"].tolist()
+
+    def _load_full(self, manifest):
+        base = manifest["base"]
+        labels = pd.read_csv(self._resolve(base["dataset"]), usecols=["label"])["label"].tolist()
+        embeddings = self._load_embeddings(self._resolve(base["embeddings"]))
+
+        index = faiss.IndexFlatL2(embeddings.shape[1])
+        index.add(embeddings)
+        applied = set(base.get("folded", []))
+        for name in manifest["segments"]:
+            seg_embeddings, seg_labels = self._load_segment(name)
+            index.add(seg_embeddings)
+            labels.extend(seg_labels)
+            applied.add(name)
+
+        self.index, self.labels, self.base = index, labels, base
+        self.applied_segments = applied
+        self._root = manifest.get("root")
+        print(f"[corpus] Loaded {index.ntotal} vectors (generation {manifest['generation']}, "
+              f"{len(manifest['segments'])} delta segments)")
+
+    def load(self):
+        with self._lock:
+            self._manifest_stamp = self._stamp()
+            self._load_full(self._read_manifest())
+        return self
+
+    def refresh(self):
+        """
+        Pick up segments appended or compacted by other processes. Only the manifest is stat'ed
+        when nothing changed; new deltas are added to the live index without a rebuild.
+        """
+        stamp = self._stamp()
+        if self.index is not None and stamp == self._manifest_stamp:
+            return False
+
+        with self._lock:
+            if self.index is not None and stamp == self._manifest_stamp:
+                return False
+            manifest = self._read_manifest()
+            needed = set(manifest["base"].get("folded", [])) | set(manifest["segments"])
+
+            # A new epoch means the base was rewritten (e.g. condensed), not just extended with folded deltas.
+            rebased = self.base is None or manifest["base"].get("epoch", 0) != self.base.get("epoch", 0)
+            if self.index is None or manifest.get("root") != self._root or rebased or not self.applied_segments <= needed:
+                self._load_full(manifest)
+            else:
+                try:
+                    for name in manifest["base"].get("folded", []) + manifest["segments"]:
+                        if name in self.applied_segments:
+                            continue
+                        seg_embeddings, seg_labels = self._load_segment(name)
+                        self.index.add(seg_embeddings)
+                        self.labels.extend(seg_labels)
+                        self.applied_segments.add(name)
+                        print(f"[corpus] Applied segment {name} ({len(seg_labels)} examples)")
+                    self.base = manifest["base"]
+                except FileNotFoundError:
+                    # A delta we lagged behind on was already compacted away; reload from the new base.
+                    self._load_full(manifest)
+            self._manifest_stamp = stamp
+            return True
+
+    def search(self, embeddings, top_k=1):
+        """Nearest-neighbour search returning (distances, indices, labels of the top hit)."""
+        self.refresh()
+        with self._lock:
+            distances, indices = self.index.search(np.ascontiguousarray(embeddings, dtype=np.float32), top_k)
+            return distances, indices, [self.labels[idx[0]] for idx in indices]
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal if self.index is not None else 0
+
+    def append(self, texts, labels, embeddings):
+        """Write a new delta segment and register it in the manifest. Returns the segment name."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if len(texts) != len(labels) or len(labels) != embeddings.shape[0]:
+            raise ValueError("texts, labels and embeddings must have the same length.")
+
+        os.makedirs(self.segments_dir, exist_ok=True)
+        name = f"delta_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}.npz"
+        tmp_path = os.path.join(self.segments_dir, f"{name}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, embeddings=embeddings, labels=np.array(labels, dtype=str), texts=np.array(texts, dtype=str))
+        os.replace(tmp_path, os.path.join(self.segments_dir, name))
+
+        with self._manifest_lock():
+            manifest = self._read_manifest()
+            manifest["segments"].append(name)
+            self._write_manifest(manifest)
+
+        print(f"[corpus] Appended segment {name} ({len(labels)} examples)")
+        return name
+
+    def compact(self, min_segments=1, retain_seconds=600):
+        """
+        Fold all current delta segments into a new base segment. The heavy rewrite happens outside
+        the manifest lock; segments appended meanwhile stay as deltas on top of the new base.
+        Superseded files are removed once they are older than `retain_seconds`, so lagging workers
+        can still apply them.
+        """
+        with self._manifest_lock():
+            manifest = self._read_manifest()
+        folding = list(manifest["segments"])
+        if len(folding) < min_segments:
+            return False
+
+        base = manifest["base"]
+        df = pd.read_csv(self._resolve(base["dataset"]), usecols=["text", "label"])
+        base_embeddings = np.load(self._resolve(base["embeddings"]))
+        frames, arrays = [df], [base_embeddings]
+        for name in folding:
+            with np.load(self._resolve(name), allow_pickle=False) as data:
+                frames.append(pd.DataFrame({"text": data["texts"].tolist(), "label": data["labels"].tolist()}))
+                arrays.append(data["embeddings"].astype(base_embeddings.dtype))
+
+        generation = manifest["generation"] + 1
+        dataset_name = f"base_{generation:06d}.csv"
+        embeddings_name = f"base_{generation:06d}.npy"
+        pd.concat(frames, ignore_index=True).to_csv(os.path.join(self.segments_dir, dataset_name), index=False)
+        np.save(os.path.join(self.segments_dir, embeddings_name), np.concatenate(arrays))
+
+        with self._manifest_lock():
+            current = self._read_manifest()
+            if current["generation"] != manifest["generation"]:
+                print("[corpus] Compaction raced with another compactor; discarding result")
+                return False
+            current["generation"] = generation
+            current["base"] = {
+                "dataset": dataset_name,
+                "embeddings": embeddings_name,
+                "folded": base.get("folded", []) + folding,
+                "epoch": base.get("epoch", 0),
+            }
+            current["segments"] = [name for name in current["segments"] if name not in folding]
+            self._write_manifest(current)
+
+        print(f"[corpus] Compacted {len(folding)} segments into generation {generation}")
+        self.cleanup(retain_seconds)
+        return True
+
+    def install_base(self, dataset_path, embeddings_path, expected_generation, retain_seconds=600):
+        """
+        Replace the base segment with a rewritten one (e.g. from condense_corpus.py) built from
+        generation `expected_generation`. Delta segments stay on top. Running classifiers see
+        the new epoch and reload in full.
+        """
+        with self._manifest_lock():
+            current = self._read_manifest()
+            if current["generation"] != expected_generation:
+                print("[corpus] Base changed while it was being rewritten; discarding result")
+                return False
+            generation = current["generation"] + 1
+            dataset_name = f"base_{generation:06d}.csv"
+            embeddings_name = f"base_{generation:06d}.npy"
+            os.replace(dataset_path, os.path.join(self.segments_dir, dataset_name))
+            os.replace(embeddings_path, os.path.join(self.segments_dir, embeddings_name))
+            current["generation"] = generation
+            current["base"] = {
+                "dataset": dataset_name,
+                "embeddings": embeddings_name,
+                "folded": current["base"].get("folded", []),
+                "epoch": current["base"].get("epoch", 0) + 1,
+            }
+            self._write_manifest(current)
+
+        print(f"[corpus] Installed rewritten base as generation {generation}")
+        self.cleanup(retain_seconds)
+        return True
+
+    def cleanup(self, retain_seconds=600):
+        """Delete segment/base files no longer referenced by the manifest and older than retain_seconds."""
+        manifest = self._read_manifest()
+        referenced = {manifest["base"]["dataset"], manifest["base"]["embeddings"], MANIFEST_NAME, "manifest.lock"}
+        referenced.update(manifest["segments"])
+        now = time.time()
+        for name in os.listdir(self.segments_dir):
+            path = os.path.join(self.segments_dir, name)
+            if name in referenced or now - os.path.getmtime(path) < retain_seconds:
+                continue
+            if name.startswith(("delta_", "base_")):
+                os.remove(path)
+
+    def start_compaction(self, interval=300, min_segments=4, retain_seconds=600):
+        """Run compact() periodically in a daemon thread."""
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.compact(min_segments=min_segments, retain_seconds=retain_seconds)
+                except Exception as e:
+                    print(f"[corpus] Background compaction failed: {e}")
+
+        thread = threading.Thread(target=_loop, name="corpus-compaction", daemon=True)
+        thread.start()
+        return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grow the reference corpus without a full rebuild.")
+    parser.add_argument("--dataset", default='./model/balanced_cleaned_dataset.csv')
+    parser.add_argument("--embeddings", default='./model/embeddings.npy')
+    parser.add_argument("--model", default='all-MiniLM-L6-v2')
+    sub = parser.add_subparsers(dest="command", required=True)
+    append_cmd = sub.add_parser("append", help="Append reviewed examples from a CSV with text,label columns.")
+    append_cmd.add_argument("csv")
+    compact_cmd = sub.add_parser("compact", help="Fold delta segments into a new base segment.")
+    compact_cmd.add_argument("--watch", type=float, default=0, help="Keep compacting every N seconds.")
+    compact_cmd.add_argument("--min-segments", type=int, default=1)
+    args = parser.parse_args()
+
+    corpus = CorpusIndex(args.dataset, args.embeddings)
+    if args.command == "append":
+        from sentence_transformers import SentenceTransformer
+        reviewed = pd.read_csv(args.csv).dropna(subset=["text", "label"])
+        texts = reviewed["text"].astype(str).tolist()
+        vectors = SentenceTransformer(args.model).encode(texts, convert_to_numpy=True, show_progress_bar=True)
+        corpus.append(texts, reviewed["label"].astype(str).tolist(), vectors)
+    elif args.watch:
+        while True:
+            corpus.compact(min_segments=args.min_segments)
+            time.sleep(args.watch)
+    else:
+        corpus.compact(min_segments=args.min_segments)
@@ -1,53 +1,83 @@
-import torch
-import joblib
 from datetime import datetime
-from transformers import DistilBertTokenizerFast, DistilBertForSequenceClassification
+import chat_log
 
 MODEL_PATH = './model/distilbert-text-classifier'
 LABEL_ENCODER_PATH = './model/label_encoder.joblib'
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print(f"Using device: {device}")
+_device = None
+
+
+def get_device():
+    """Pick CUDA/CPU on first use rather than probing the GPU at import time."""
+    global _device
+    if _device is None:
+        import torch
+        _device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        print(f"Using device: {_device}")
+    return _device
 
 class DisorderPredicter:
 
-    def __init__(self, filepath):
+    def __init__(self, filepath=None, human_messages=None, client=None, archive=None, user_id=None):
+        self.filepath = filepath
+        self.human_messages = human_messages
+        # ChatArchive to read `user_id`'s full history from instead of the file at `filepath`.
+        self.archive = archive
+        self.user_id = user_id
+        # ModelClient for a shared model server (model_server.py); the model is not loaded in this process.
+        self.client = client
+        if client is not None:
+            self.model = self.tokenizer = self.label_encoder = None
+            return
+
+        import joblib
+        from transformers import DistilBertTokenizerFast, DistilBertForSequenceClassification
         self.model = DistilBertForSequenceClassification.from_pretrained(MODEL_PATH)
         self.tokenizer = DistilBertTokenizerFast.from_pretrained(MODEL_PATH)
         self.label_encoder = joblib.load(LABEL_ENCODER_PATH)
-        self.filepath = filepath
 
     
     def chatprocessor(self):
         chat_dict = {'AI': [], 'Human': []}
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        with open(self.filepath, 'r') as f:
-            lines = f.readlines()
-
-        for line in lines:
-            line = line.strip()
-
-            if line.startswith('Human'):
-                chat_dict['Human'].append(line[7:])
-
-            elif line.startswith('AI'):
-                chat_dict['AI'].append(line[4:])
+        if self.human_messages is not None:
+            chat_dict['Human'] = list(self.human_messages)
+            return chat_dict
+
+        # With an archive, the user's compacted conversations are read along with the hot log.
+        if self.archive is not None:
+            history = self.archive.iter_messages(self.user_id, include_archive=True)
+        else:
+            history = chat_log.iter_messages(self.filepath)
+        for message in history:
+            if message.role == chat_log.USER:
+                chat_dict['Human'].append(message.text)
+            else:
+                chat_dict['AI'].append(message.text)
 
         print("Chat processed at: ", current_time)
         return chat_dict
     
 
     def chatpredictor(self):
-        self.model.to(device)
-
         chat_dict = self.chatprocessor()
         human_sent = chat_dict['Human']
         print(human_sent)
         print(len(human_sent), '\n')
 
+        if self.client is not None:
+            return self.client.predict_disorder(human_sent)
+        return self.predict(human_sent)
+
+    def predict(self, texts):
+        import torch
+
+        device = get_device()
+        self.model.to(device)
+
         encodings = self.tokenizer(
-            human_sent, 
+            texts, 
             padding=True, 
             truncation=True, 
             return_tensors='pt'
@@ -64,9 +94,10 @@ class DisorderPredicter:
     
 if __name__=="__main__":
 
-    filepath = './chat_logs/chat_history_1.txt'
+    from chat_archive import ChatArchive
+    from storage import LocalStorage
 
-    chat = DisorderPredicter(filepath=filepath)
+    chat = DisorderPredicter(archive=ChatArchive(LocalStorage('.')), user_id='1')
     result = chat.chatpredictor()
 
     print(result)
@@ -0,0 +1,97 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """
+    Minimal Groq/OpenAI-compatible chat completions endpoint with tunable latency and failures.
+    Run the app with GROQ_API_BASE=http://127.0.0.1:<port> to exercise the LLM gateway locally.
+    """
+
+    delay = 0.0
+    jitter = 0.0
+    failure_rate = 0.0
+    failure_status = 503
+    fail_first = 0
+    served = 0
+    in_flight = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.served += 1
+            in_flight, served = cls.in_flight, cls.served
+        try:
+            time.sleep(cls.delay + random.uniform(0, cls.jitter))
+
+            if served <= cls.fail_first or random.random() < cls.failure_rate:
+                self._send_json(cls.failure_status, {"error": {"message": "fake upstream failure"}})
+                return
+
+            last_user = next(
+                (m.get("content", "") for m in reversed(request.get("messages", [])) if m.get("role") == "user"),
+                ""
+            )
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": f"(fake, {in_flight} in flight) You said: {last_user}"},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+def serve(port=8089, delay=0.0, jitter=0.0, failure_rate=0.0, failure_status=503, fail_first=0):
+    FakeLLMHandler.delay = delay
+    FakeLLMHandler.jitter = jitter
+    FakeLLMHandler.failure_rate = failure_rate
+    FakeLLMHandler.failure_status = failure_status
+    FakeLLMHandler.fail_first = fail_first
+    FakeLLMHandler.served = 0
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeLLMHandler)
+    print(f"[fake_llm] Listening on http://127.0.0.1:{server.server_address[1]} "
+          f"(delay={delay}s, jitter={jitter}s, failure_rate={failure_rate})")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake LLM server for gateway testing.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random delay up to this many seconds.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests that fail.")
+    parser.add_argument("--failure-status", type=int, default=503)
+    parser.add_argument("--fail-first", type=int, default=0, help="Fail this many requests before any succeed.")
+    args = parser.parse_args()
+
+    serve(args.port, args.delay, args.jitter, args.failure_rate, args.failure_status,
+          args.fail_first).serve_forever()
@@ -0,0 +1,115 @@
+import threading
+import time
+
+
+class LazyRegistry:
+    def __init__(self, retry_after=30.0):
+        """
+        Registry of heavy components that are built on first use instead of at import time.
+        A failed build is re-raised without retrying for `retry_after` seconds, then tried again.
+        """
+        self.retry_after = retry_after
+        self._factories = {}
+        self._instances = {}
+        self._errors = {}
+        self._timings = {}
+        self._loaded_by = {}
+        self._locks = {}
+        self._registry_lock = threading.Lock()
+        self._warmup_thread = None
+        self.created_at = time.perf_counter()
+
+    def register(self, name, factory):
+        """Register a zero-argument factory that builds the component called `name`."""
+        with self._registry_lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def record(self, name, seconds):
+        """Record the duration of an eager startup phase so it shows up in the report."""
+        self._timings[name] = seconds
+        self._loaded_by.setdefault(name, threading.current_thread().name)
+
+    def get(self, name):
+        """Return the component, building it once. A recent failure is re-raised until its cooldown ends."""
+        if name in self._instances:
+            return self._instances[name]
+        if name not in self._factories:
+            raise KeyError(f"Unknown component: {name}")
+
+        with self._locks[name]:
+            if name in self._instances:
+                return self._instances[name]
+            if name in self._errors:
+                error, failed_at = self._errors[name]
+                # Failures such as a download hiccup or a MemoryError during warm-up may be transient.
+                if time.monotonic() - failed_at < self.retry_after:
+                    raise error
+
+            start = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                self._errors[name] = (e, time.monotonic())
+                self._timings[name] = time.perf_counter() - start
+                self._loaded_by[name] = threading.current_thread().name
+                print(f"[startup] {name} failed after {self._timings[name]:.2f}s: {e}")
+                raise
+
+            self._timings[name] = time.perf_counter() - start
+            self._loaded_by[name] = threading.current_thread().name
+            self._instances[name] = instance
+            self._errors.pop(name, None)
+            print(f"[startup] {name} loaded in {self._timings[name]:.2f}s")
+            return instance
+
+    def get_optional(self, name):
+        """Like get(), but returns None when the component cannot be built in this runtime."""
+        try:
+            return self.get(name)
+        except Exception:
+            return None
+
+    def warm_up(self, names=None, background=True):
+        """Build the given components (default: all) now, optionally in a daemon thread."""
+        names = list(names) if names is not None else list(self._factories)
+
+        def _run():
+            for name in names:
+                self.get_optional(name)
+            print(f"[startup] warm-up finished: {self.startup_report()['components']}")
+
+        if not background:
+            _run()
+            return None
+
+        with self._registry_lock:
+            if self._warmup_thread is None:
+                self._warmup_thread = threading.Thread(target=_run, name="lazy-warmup", daemon=True)
+                self._warmup_thread.start()
+        return self._warmup_thread
+
+    def startup_report(self):
+        """Per-component load status and timing, suitable for JSON."""
+        components = {}
+        for name in list(self._timings) + [n for n in self._factories if n not in self._timings]:
+            if name in self._instances:
+                status = "loaded"
+            elif name in self._errors:
+                status = "failed"
+            elif name in self._factories:
+                status = "pending"
+            else:
+                status = "done"
+            entry = {"status": status, "seconds": round(self._timings.get(name, 0.0), 4)}
+            if name in self._loaded_by:
+                entry["loaded_by"] = self._loaded_by[name]
+            if name in self._errors:
+                entry["error"] = str(self._errors[name][0])
+            components[name] = entry
+
+        return {
+            "uptime_seconds": round(time.perf_counter() - self.created_at, 2),
+            "warmup_running": bool(self._warmup_thread and self._warmup_thread.is_alive()),
+            "components": components,
+        }
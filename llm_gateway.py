@@ -0,0 +1,221 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class LLMUnavailable(Exception):
+    """The LLM could not be reached in time; callers should answer with a fast 503."""
+
+
+class GatewayOverloaded(LLMUnavailable):
+    pass
+
+
+class GatewayTimeout(LLMUnavailable):
+    pass
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+# HTTP statuses that will not get better by retrying.
+NON_RETRYABLE_STATUS = {400, 401, 403, 404, 422}
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """Opens after `failure_threshold` consecutive failures; lets one probe through after `reset_timeout`."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Give back a half-open probe that never reached the upstream."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._probe_in_flight or self.consecutive_failures >= self.failure_threshold:
+                if self.opened_at is None or self._probe_in_flight:
+                    print(f"[llm_gateway] Circuit opened after {self.consecutive_failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class LLMGateway:
+    def __init__(self, max_concurrency=4, max_queue=16, timeout=30.0, max_retries=2, backoff_base=0.5,
+                 backoff_max=4.0, breaker=None):
+        """
+        Shared front door for all outbound LLM calls.
+        - at most `max_concurrency` calls in flight, and at most `max_queue` callers waiting for a slot;
+          anyone beyond that is rejected immediately with GatewayOverloaded
+        - each invoke() has a `timeout` second deadline covering queueing, retries and backoff
+        - failed attempts are retried with full-jitter exponential backoff
+        - a CircuitBreaker fails calls fast while the upstream is down
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-call")
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._clients = {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", "16")),
+            timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30")),
+            ),
+        )
+
+    def client(self, model_name, api_key):
+        """A ChatGroq client shared by every caller using the same model and key."""
+        key = (model_name, api_key)
+        with self._lock:
+            if key not in self._clients:
+                from langchain_groq import ChatGroq
+                kwargs = {}
+                # Point at a local fake server (see fake_llm_server.py) for load and failure testing.
+                if os.getenv("GROQ_API_BASE"):
+                    kwargs["base_url"] = os.getenv("GROQ_API_BASE")
+                # Retries and deadlines are owned by the gateway, not the client.
+                self._clients[key] = ChatGroq(model_name=model_name, api_key=api_key, timeout=self.timeout,
+                                              max_retries=0, **kwargs)
+            return self._clients[key]
+
+    def stats(self):
+        return {
+            "waiting": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+        }
+
+    def _acquire_slot(self, deadline):
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                raise GatewayOverloaded("LLM request queue is full.")
+            self._waiting += 1
+        try:
+            if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise GatewayOverloaded("Timed out waiting for an LLM slot.")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    @staticmethod
+    def _is_retryable(error):
+        status = getattr(error, "status_code", None)
+        if status is None:
+            status = getattr(getattr(error, "response", None), "status_code", None)
+        return status not in NON_RETRYABLE_STATUS
+
+    def _backoff(self, attempt, deadline):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        remaining = deadline - time.monotonic()
+        if delay >= remaining:
+            return False
+        time.sleep(delay)
+        return True
+
+    def _attempt(self, client, messages, deadline):
+        self._acquire_slot(deadline)
+        future = self._executor.submit(client.invoke, messages)
+        # The slot is held until the upstream call really finishes, even if this caller gives up,
+        # so a slow upstream cannot pile more than max_concurrency calls onto it.
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            raise GatewayTimeout("LLM call exceeded its deadline.")
+
+    def invoke(self, client, messages):
+        """Run client.invoke(messages) under the gateway's admission, deadline, retry and breaker policy."""
+        if not self.breaker.allow():
+            raise CircuitOpen("LLM temporarily unavailable (circuit open).")
+
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            try:
+                response = self._attempt(client, messages, deadline)
+            except GatewayOverloaded:
+                # Our own queue is full; that says nothing about upstream health.
+                self.breaker.release_probe()
+                raise
+            except GatewayTimeout:
+                self.breaker.record_failure()
+                raise
+            except Exception as e:
+                if not self._is_retryable(e):
+                    # A 4xx such as a bad API key is our request's fault; the upstream answered,
+                    # so it must not open the circuit and turn a config error into 503s.
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries or not self.breaker.allow() or not self._backoff(attempt, deadline):
+                    raise LLMUnavailable(f"LLM call failed: {e}") from e
+                attempt += 1
+                print(f"[llm_gateway] Retry {attempt}/{self.max_retries} after error: {e}")
+                continue
+
+            self.breaker.record_success()
+            return response
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway():
+    """Process-wide gateway shared by CounselorChatbot and CounselorAI."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway.from_env()
+        return _gateway
@@ -1,17 +1,21 @@
 from conversation import CounselorChatbot
 from recommendation import CounselorAI
+from chat_archive import ChatArchive
+from storage import LocalStorage
 
 
 def main():
     user_id = input("Enter your User ID: ")  # Unique user ID for chat history tracking
 
     # Start chat session
-    chatbot = CounselorChatbot()
+    # Reads go through the archive so conversations compacted out of chat_logs/ are kept.
+    archive = ChatArchive(LocalStorage("."))
+    chatbot = CounselorChatbot(archive=archive)
     chatbot.chat(user_id)
 
     # Generate recommendation based on chat history
     print("\n🔹 Generating your personalized recommendation...\n")
-    counselor_ai = CounselorAI()
+    counselor_ai = CounselorAI(archive=archive)
     chat_history_file = chatbot.get_chat_history_path(user_id)
     recommendation = counselor_ai.generate_recommendation(chat_history_file)
 
@@ -0,0 +1,318 @@
+import json
+import os
+import sqlite3
+import time
+from typing import NamedTuple, Optional
+
+import chat_log
+
+# Session id given to history imported from the pre-database text logs.
+LEGACY_SESSION = "legacy"
+# Session id used when a caller has no login session (e.g. the CLI chat loop).
+DEFAULT_SESSION = "default"
+
+
+class StoredMessage(NamedTuple):
+    userid: str
+    session_id: str
+    seq: int
+    role: str
+    text: str
+    timestamp: str
+    label: Optional[str]
+
+
+_COLUMNS = "userid, session_id, seq, role, text, timestamp, label"
+
+
+class MessageStore:
+    def __init__(self, db_path, shared_log=None):
+        """
+        Chat messages in the `messages` table of the app database, one row per message.
+
+        With `shared_log` (a StorageBackend shared by every node), each user's messages are
+        appended to `<userid>.jsonl` there and the table becomes a node-local copy: reads
+        first pull any entries other nodes appended, in log order, so seq numbers agree
+        across nodes. Cached labels stay local to the node.
+        """
+        self.db_path = db_path
+        self.shared_log = shared_log
+        self.fts_enabled = None
+        self._schema_ready = False
+
+    def _connect(self):
+        # The schema statements are idempotent, so every process creates it on first use
+        # whether it was started by `python app.py`, gunicorn or `flask run`.
+        if not self._schema_ready:
+            self.init_schema()
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _fetch(self, query, params):
+        with self._connect() as conn:
+            return [StoredMessage(*row) for row in conn.execute(query, params).fetchall()]
+
+    def _has_fts(self):
+        if self.fts_enabled is None:
+            with self._connect() as conn:
+                row = conn.execute("SELECT 1 FROM sqlite_master WHERE name='messages_fts'").fetchone()
+            self.fts_enabled = row is not None
+        return self.fts_enabled
+
+    def init_schema(self):
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            # seq is per user and increases across sessions, so "last N turns" is a range scan.
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    userid TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    label TEXT,
+                    PRIMARY KEY (userid, session_id, seq)
+                )
+            ''')
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_user_seq ON messages (userid, seq)')
+            # How far into each user's shared log this node's rows go (shared_log mode only).
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS message_log_sync (
+                    userid TEXT PRIMARY KEY,
+                    generation TEXT NOT NULL,
+                    log_offset INTEGER NOT NULL
+                )
+            ''')
+
+            try:
+                conn.execute('''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts
+                    USING fts5(text, content='messages', content_rowid='rowid')
+                ''')
+                conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                        INSERT INTO messages_fts(rowid, text) VALUES (new.rowid, new.text);
+                    END
+                ''')
+                conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                        INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                    END
+                ''')
+                conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF text ON messages BEGIN
+                        INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                        INSERT INTO messages_fts(rowid, text) VALUES (new.rowid, new.text);
+                    END
+                ''')
+                self.fts_enabled = True
+            except sqlite3.OperationalError as e:
+                print(f"[message_store] FTS5 unavailable, search falls back to LIKE: {e}")
+                self.fts_enabled = False
+            conn.commit()
+        self._schema_ready = True
+
+    @staticmethod
+    def _insert(conn, userid, session_id, messages):
+        last = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM messages WHERE userid=?', (userid,)).fetchone()[0]
+        seqs = list(range(last + 1, last + 1 + len(messages)))
+        conn.executemany(
+            'INSERT INTO messages (userid, session_id, seq, role, text) VALUES (?, ?, ?, ?, ?)',
+            [(userid, session_id, seq, role, text) for seq, (role, text) in zip(seqs, messages)]
+        )
+        return seqs
+
+    @staticmethod
+    def _log_key(userid):
+        return f"{userid}.jsonl"
+
+    def sync(self, userid):
+        """Copy entries other nodes appended to the user's shared log into the local table."""
+        if self.shared_log is None:
+            return
+        key = self._log_key(userid)
+        remote = self.shared_log.stat(key)
+        if remote is None:
+            return
+        with self._connect() as conn:
+            row = conn.execute('SELECT generation, log_offset FROM message_log_sync WHERE userid=?', (userid,)).fetchone()
+        if row == (str(remote[0]), remote[1]):
+            return
+
+        with self._connect() as conn:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Re-read under the write lock: another worker on this node may have synced meanwhile.
+                row = conn.execute('SELECT generation, log_offset FROM message_log_sync WHERE userid=?', (userid,)).fetchone()
+                remote = self.shared_log.stat(key)
+                generation = str(remote[0]) if remote is not None else None
+                if row is None or row[0] != generation:
+                    # First sync on this node, or the log was rewritten: the log is authoritative.
+                    conn.execute('DELETE FROM messages WHERE userid=?', (userid,))
+                    offset = 0
+                else:
+                    offset = row[1]
+
+                data = self.shared_log.read_range(key, offset) or b""
+                # A line without its newline is still being appended; it is picked up next time.
+                end = data.rfind(b"\n") + 1
+                entries = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+                last = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM messages WHERE userid=?', (userid,)).fetchone()[0]
+                conn.executemany(
+                    'INSERT INTO messages (userid, session_id, seq, role, text, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(userid, entry["session_id"], last + i, entry["role"], entry["text"], entry["timestamp"])
+                     for i, entry in enumerate(entries, 1)]
+                )
+                if generation is not None:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO message_log_sync (userid, generation, log_offset) VALUES (?, ?, ?)',
+                        (userid, generation, offset + end)
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def _write_shared(self, userid, session_id, messages, only_if_empty):
+        key = self._log_key(userid)
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        data = b"".join(
+            json.dumps({"session_id": session_id, "role": role, "text": text, "timestamp": timestamp}).encode("utf-8") + b"\n"
+            for role, text in messages
+        )
+        # Every writer holds the log lock, so after the sync our entries are the user's last rows.
+        with self.shared_log.lock(key):
+            if only_if_empty and self.shared_log.exists(key):
+                return []
+            self.shared_log.append(key, data)
+            self.sync(userid)
+            last = self.last_seq(userid)
+        return list(range(last - len(messages) + 1, last + 1))
+
+    def _write(self, userid, session_id, messages, only_if_empty=False):
+        if self.shared_log is not None:
+            return self._write_shared(userid, session_id, messages, only_if_empty)
+        with self._connect() as conn:
+            # IMMEDIATE takes the write lock before reading MAX(seq), so concurrent workers cannot collide.
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if only_if_empty and conn.execute(
+                    'SELECT 1 FROM messages WHERE userid=? LIMIT 1', (userid,)
+                ).fetchone():
+                    seqs = []
+                else:
+                    seqs = self._insert(conn, userid, session_id, messages)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return seqs
+
+    def append(self, userid, session_id, messages):
+        """Append (role, text) pairs to a session. Returns the assigned seq numbers."""
+        messages = list(messages)
+        if not messages:
+            return []
+        return self._write(userid, session_id, messages)
+
+    def session_messages(self, userid, session_id):
+        self.sync(userid)
+        return self._fetch(
+            f'SELECT {_COLUMNS} FROM messages WHERE userid=? AND session_id=? ORDER BY seq',
+            (userid, session_id)
+        )
+
+    def recent_messages(self, userid, limit):
+        """The last `limit` messages across all of the user's sessions, oldest first."""
+        self.sync(userid)
+        rows = self._fetch(
+            f'SELECT {_COLUMNS} FROM messages WHERE userid=? ORDER BY seq DESC LIMIT ?',
+            (userid, limit)
+        )
+        return rows[::-1]
+
+    def user_messages(self, userid, role=None, after_seq=0):
+        self.sync(userid)
+        query = f'SELECT {_COLUMNS} FROM messages WHERE userid=? AND seq>?'
+        params = [userid, after_seq]
+        if role is not None:
+            query += ' AND role=?'
+            params.append(role)
+        return self._fetch(query + ' ORDER BY seq', params)
+
+    def has_messages(self, userid):
+        self.sync(userid)
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM messages WHERE userid=? LIMIT 1', (userid,)).fetchone() is not None
+
+    def last_seq(self, userid):
+        self.sync(userid)
+        with self._connect() as conn:
+            return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM messages WHERE userid=?', (userid,)).fetchone()[0]
+
+    def user_ids(self):
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute('SELECT DISTINCT userid FROM messages')]
+
+    def set_labels(self, userid, labels):
+        """Cache classifier labels as (seq, label) pairs."""
+        with self._connect() as conn:
+            conn.executemany(
+                'UPDATE messages SET label=? WHERE userid=? AND seq=?',
+                [(label, userid, seq) for seq, label in labels]
+            )
+            conn.commit()
+
+    def sample_messages(self, role=None, limit=1000):
+        """Random messages across all users, e.g. as held-out queries for corpus evaluation."""
+        if role is None:
+            return self._fetch(f'SELECT {_COLUMNS} FROM messages ORDER BY RANDOM() LIMIT ?', (limit,))
+        return self._fetch(f'SELECT {_COLUMNS} FROM messages WHERE role=? ORDER BY RANDOM() LIMIT ?', (role, limit))
+
+    @staticmethod
+    def _fts_query(query):
+        # Each word becomes a quoted FTS5 string, so user text such as "can't" or "a OR" is never
+        # parsed as query syntax; the words are matched together, in any order.
+        return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+    def search(self, userid, query, limit=20):
+        """Full-text search over one user's messages, best match first."""
+        self.sync(userid)
+        if not query.strip():
+            return []
+        if self._has_fts():
+            return self._fetch(
+                '''
+                SELECT m.userid, m.session_id, m.seq, m.role, m.text, m.timestamp, m.label
+                FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid
+                WHERE messages_fts MATCH ? AND m.userid=?
+                ORDER BY messages_fts.rank LIMIT ?
+                ''',
+                (self._fts_query(query), userid, limit)
+            )
+        return self._fetch(
+            f'SELECT {_COLUMNS} FROM messages WHERE userid=? AND text LIKE ? ORDER BY seq DESC LIMIT ?',
+            (userid, f"%{query}%", limit)
+        )
+
+    def import_chat_log(self, userid, path, session_id=LEGACY_SESSION, only_if_empty=True):
+        """
+        Import a `You:`/`AI:` text log. Returns the number of messages written.
+        With only_if_empty, users that already have rows are left alone, so re-running is safe.
+        """
+        entries = [(message.role, message.text) for message in chat_log.iter_messages(path)]
+        if not entries:
+            return 0
+        return len(self._write(userid, session_id, entries, only_if_empty=only_if_empty))
+
+    def ensure_imported(self, userid, path):
+        """Pull a user's legacy text log into the table the first time they are seen."""
+        if self.shared_log is not None:
+            seen = self.shared_log.exists(self._log_key(userid))
+        else:
+            seen = self.has_messages(userid)
+        if not seen and os.path.exists(path):
+            count = self.import_chat_log(userid, path)
+            if count:
+                print(f"[message_store] Imported {count} legacy messages for user_id={userid}")
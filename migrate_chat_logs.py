@@ -0,0 +1,47 @@
+import argparse
+import os
+import re
+
+from message_store import MessageStore, LEGACY_SESSION
+
+CHAT_FILE_PATTERN = re.compile(r"^chat_history_(?P<userid>.+)\.txt$")
+
+
+def migrate(chat_dir, db_path, session_id=LEGACY_SESSION, force=False):
+    """Import every chat_history_<userid>.txt in chat_dir into the messages table."""
+    store = MessageStore(db_path)
+    store.init_schema()
+
+    imported_users = 0
+    imported_messages = 0
+    skipped = 0
+
+    for name in sorted(os.listdir(chat_dir)):
+        match = CHAT_FILE_PATTERN.match(name)
+        if not match:
+            continue
+        userid = match.group("userid")
+        count = store.import_chat_log(userid, os.path.join(chat_dir, name), session_id=session_id,
+                                      only_if_empty=not force)
+        if count:
+            imported_users += 1
+            imported_messages += count
+            print(f"[migrate] {userid}: {count} messages")
+        else:
+            skipped += 1
+            print(f"[migrate] {userid}: skipped (already imported or empty)")
+
+    print(f"[migrate] Done. users={imported_users}, messages={imported_messages}, skipped={skipped}")
+    return imported_users, imported_messages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import text chat logs into the SQLite messages table.")
+    parser.add_argument("--chat-dir", default="./chat_logs")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "./users.db"))
+    parser.add_argument("--session-id", default=LEGACY_SESSION)
+    parser.add_argument("--force", action="store_true",
+                        help="Import even for users that already have rows (may duplicate history).")
+    args = parser.parse_args()
+
+    migrate(args.chat_dir, args.db, session_id=args.session_id, force=args.force)
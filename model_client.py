@@ -0,0 +1,26 @@
+import os
+import threading
+
+# Kept free of numpy and the HTTP client so app.py can import it without paying for either;
+# model_server is only imported once a model server is actually configured.
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def model_server_address():
+    """MODEL_SERVER_URL, or None when the models load in-process."""
+    return os.getenv("MODEL_SERVER_URL") or None
+
+
+def get_model_client():
+    """Shared ModelClient when MODEL_SERVER_URL is set, otherwise None (models load in-process)."""
+    global _client
+    address = model_server_address()
+    if not address:
+        return None
+    with _client_lock:
+        if _client is None or _client.address != address:
+            from model_server import ModelClient
+            _client = ModelClient(address, timeout=float(os.getenv("MODEL_SERVER_TIMEOUT", "30")))
+        return _client
@@ -0,0 +1,319 @@
+import argparse
+import base64
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+
+
+class ModelServerUnavailable(Exception):
+    """The model server could not be reached or returned an error."""
+
+
+def encode_array(array):
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    return {"dtype": "float32", "shape": list(array.shape), "data": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def decode_array(payload):
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype=payload["dtype"]).reshape(payload["shape"])
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch=64, max_wait=0.005, name="batcher"):
+        """
+        Coalesces concurrent submit() calls into one `fn(items)` call.
+        The worker takes the first waiting request, then keeps collecting for up to `max_wait`
+        seconds or until `max_batch` items are queued, runs `fn` once and hands each caller its slice.
+        """
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, items):
+        """Run `fn` over `items` as part of a shared batch and return their results in order."""
+        if not items:
+            return []
+        future = Future()
+        self._queue.put((list(items), future))
+        return future.result()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0,
+            "queued": self._queue.qsize(),
+        }
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(request)
+            size += len(request[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            items = [item for request_items, _ in pending for item in request_items]
+            try:
+                results = list(self.fn(items))
+            except Exception as e:
+                if len(pending) == 1:
+                    pending[0][1].set_exception(e)
+                else:
+                    # One caller's bad input must not fail the others; rerun each request alone.
+                    print(f"[{self.name}] Batch of {len(pending)} requests failed ({e}); retrying one by one")
+                    for request_items, future in pending:
+                        try:
+                            future.set_result(list(self.fn(request_items)))
+                        except Exception as request_error:
+                            future.set_exception(request_error)
+                continue
+
+            self.batches += 1
+            self.items += len(items)
+            position = 0
+            for request_items, future in pending:
+                future.set_result(results[position:position + len(request_items)])
+                position += len(request_items)
+
+
+class ModelServer:
+    def __init__(self, dataset_path, embeddings_path, model_name='all-MiniLM-L6-v2', load_disorder=True,
+                 max_batch=64, max_wait=0.005):
+        """
+        Owns one copy of the SentenceTransformer, the FAISS corpus and (optionally) the DistilBERT
+        disorder model for every web worker on the host. Encode, classify and disorder requests
+        from concurrent callers are micro-batched before they reach the models.
+        """
+        from RAGclassifier import RAGSimilarityClassifier
+
+        self.rag = RAGSimilarityClassifier(dataset_path, embeddings_path, model_name=model_name)
+        self.disorder = None
+        if load_disorder:
+            try:
+                from disorder import DisorderPredicter
+                self.disorder = DisorderPredicter()
+            except Exception as e:
+                print(f"[model_server] Disorder model unavailable: {e}")
+
+        self.encode_batcher = MicroBatcher(lambda texts: list(self.rag.encode(texts, batch_size=max_batch)),
+                                           max_batch, max_wait, name="batch-encode")
+        self.classify_batcher = MicroBatcher(lambda texts: self.rag.classify(texts, batch_size=max_batch),
+                                             max_batch, max_wait, name="batch-classify")
+        self.disorder_batcher = None
+        if self.disorder is not None:
+            self.disorder_batcher = MicroBatcher(lambda texts: [str(label) for label in self.disorder.predict(texts)],
+                                                 max_batch, max_wait, name="batch-disorder")
+
+    def encode(self, texts):
+        return np.asarray(self.encode_batcher.submit(texts), dtype=np.float32)
+
+    def search(self, embeddings, top_k=1):
+        # A search call already carries a whole batch of vectors, so it goes straight to FAISS.
+        distances, indices, labels = self.rag.corpus.search(embeddings, top_k)
+        return {"distances": encode_array(distances), "indices": np.asarray(indices).tolist(),
+                "labels": [str(label) for label in labels]}
+
+    def classify(self, texts, top_k=1):
+        if top_k != 1:
+            return [str(label) for label in self.rag.classify(texts, top_k=top_k)]
+        return [str(label) for label in self.classify_batcher.submit(texts)]
+
+    def predict_disorder(self, texts):
+        if self.disorder_batcher is None:
+            raise ModelServerUnavailable("Disorder model is not loaded in this model server.")
+        return self.disorder_batcher.submit(texts)
+
+    def stats(self):
+        batchers = [self.encode_batcher, self.classify_batcher, self.disorder_batcher]
+        return {
+            "corpus_vectors": self.rag.corpus.ntotal,
+            "disorder_loaded": self.disorder is not None,
+            "batchers": {b.name: b.stats() for b in batchers if b is not None},
+        }
+
+    @staticmethod
+    def request_texts(request):
+        """Check that `request["texts"]` is a list of strings before it joins a shared batch."""
+        texts = request.get("texts")
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            raise ValueError("'texts' must be a list of strings.")
+        return texts
+
+    def handle(self, path, request):
+        if path == "/encode":
+            return {"embeddings": encode_array(self.encode(self.request_texts(request)))}
+        if path == "/search":
+            return self.search(decode_array(request["embeddings"]), request.get("top_k", 1))
+        if path == "/classify":
+            return {"labels": self.classify(self.request_texts(request), request.get("top_k", 1))}
+        if path == "/disorder":
+            return {"labels": self.predict_disorder(self.request_texts(request))}
+        return None
+
+
+class ModelRequestHandler(BaseHTTPRequestHandler):
+    """JSON-over-HTTP front end for ModelServer; the same handler serves TCP and Unix sockets."""
+
+    model_server = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", **self.model_server.stats()})
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+            response = self.model_server.handle(self.path, request)
+        except Exception as e:
+            print(f"[model_server] {self.path} failed: {e}")
+            self._send_json(500, {"error": str(e)})
+            return
+        if response is None:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+        else:
+            self._send_json(200, response)
+
+
+class ModelHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Every web worker connects per request; the socketserver default backlog of 5 is far too small.
+    request_queue_size = 128
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def serve(model_server, address):
+    """Bind `address` ("unix:///path/to.sock" or "http://127.0.0.1:PORT") and return the server."""
+    ModelRequestHandler.model_server = model_server
+    parsed = urlparse(address)
+    if parsed.scheme == "unix":
+        if os.path.exists(parsed.path):
+            os.remove(parsed.path)
+        server = ThreadingUnixHTTPServer(parsed.path, ModelRequestHandler)
+    else:
+        server = ModelHTTPServer((parsed.hostname or "127.0.0.1", parsed.port or 8090), ModelRequestHandler)
+    print(f"[model_server] Listening on {address}")
+    return server
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ModelClient:
+    def __init__(self, address, timeout=30.0):
+        """Client for a ModelServer at `address` ("unix:///path/to.sock" or "http://host:port")."""
+        self.address = address
+        self.timeout = timeout
+        self._parsed = urlparse(address)
+
+    def _connection(self):
+        if self._parsed.scheme == "unix":
+            return _UnixHTTPConnection(self._parsed.path, self.timeout)
+        return http.client.HTTPConnection(self._parsed.hostname, self._parsed.port or 8090, timeout=self.timeout)
+
+    def _request(self, method, path, payload=None):
+        connection = self._connection()
+        try:
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = json.loads(response.read() or b"{}")
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            raise ModelServerUnavailable(f"Model server at {self.address} unreachable: {e}") from e
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise ModelServerUnavailable(f"Model server {path} returned {response.status}: {data.get('error')}")
+        return data
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def encode(self, texts):
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return decode_array(self._request("POST", "/encode", {"texts": list(texts)})["embeddings"])
+
+    def search(self, embeddings, top_k=1):
+        response = self._request("POST", "/search", {"embeddings": encode_array(embeddings), "top_k": top_k})
+        return decode_array(response["distances"]), np.asarray(response["indices"]), response["labels"]
+
+    def classify(self, texts, top_k=1):
+        if not texts:
+            return []
+        return self._request("POST", "/classify", {"texts": list(texts), "top_k": top_k})["labels"]
+
+    def predict_disorder(self, texts):
+        if not texts:
+            return []
+        return self._request("POST", "/disorder", {"texts": list(texts)})["labels"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the classifier models to every web worker on this host.")
+    parser.add_argument("--address", default=os.getenv("MODEL_SERVER_URL", "unix:///tmp/mindease-models.sock"),
+                        help='"unix:///path/to.sock" or "http://127.0.0.1:8090"')
+    parser.add_argument("--dataset", default='./model/balanced_cleaned_dataset.csv')
+    parser.add_argument("--embeddings", default='./model/embeddings.npy')
+    parser.add_argument("--model", default='all-MiniLM-L6-v2')
+    parser.add_argument("--no-disorder", action="store_true", help="Do not load the DistilBERT disorder model.")
+    parser.add_argument("--max-batch", type=int, default=64, help="Texts per micro-batch.")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long to hold a batch open for more callers.")
+    args = parser.parse_args()
+
+    model_server = ModelServer(args.dataset, args.embeddings, args.model, load_disorder=not args.no_disorder,
+                               max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+    serve(model_server, args.address).serve_forever()
@@ -1,17 +1,25 @@
 import os
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+import chat_log
+from llm_gateway import get_llm_gateway
+from storage import LocalStorage
 
 class CounselorAI:
-    def __init__(self, model_name="llama-3.1-8b-instant"):
-        """Initialize the AI with a Groq model."""
+    def __init__(self, model_name="llama-3.1-8b-instant", message_store=None, storage=None, gateway=None,
+                 archive=None):
+        """
+        Initialize the AI with a Groq model. History is read from `message_store` when given, otherwise
+        through `archive` (a ChatArchive, so compacted conversations are included) or the text file;
+        recommendations are written to `storage`, defaulting to files in RECOMMENDATION_DIR.
+        """
         # Load environment variables
         load_dotenv()
         self.api_key = os.getenv("CHAT_GROQ_API_KEY")
 
-        # Initialize ChatGroq model
-        self.chat_groq = ChatGroq(model_name=model_name, api_key=self.api_key)
+        # Shared ChatGroq client; every call goes through the process-wide LLM gateway
+        self.gateway = gateway or get_llm_gateway()
+        self.chat_groq = self.gateway.client(model_name, self.api_key)
 
         # Define the system prompt
         self.system_prompt = SystemMessage(
@@ -20,22 +28,42 @@ class CounselorAI:
                     "be empathetic, insightful, and helpful."
         )
 
-    def load_chat_history(self, file_path):
-        """Load chat history from a text file and format it into messages."""
+        self.message_store = message_store
+        self.storage = storage
+        self.archive = archive
+
+    def load_chat_history(self, file_path, user_id=None):
+        """Load chat history, archived conversations included when there is an archive, and format it into messages."""
+        if self.archive is not None and user_id is not None:
+            history = self.archive.iter_messages(user_id, include_archive=True)
+        else:
+            history = chat_log.iter_messages(file_path)
         messages = []
-        with open(file_path, "r", encoding="utf-8") as file:
-            lines = file.readlines()
-            for line in lines:
-                if line.startswith("You:"):
-                    messages.append(HumanMessage(content=line.replace("You:", "").strip()))
-                elif line.startswith("AI:"):
-                    messages.append(AIMessage(content=line.replace("AI:", "").strip()))
+        for message in history:
+            if message.role == chat_log.USER:
+                messages.append(HumanMessage(content=message.text))
+            else:
+                messages.append(AIMessage(content=message.text))
         return messages
 
-    def generate_recommendation(self, chat_history_file, user_id):
+    def load_stored_history(self, user_id, session_id=None):
+        """Messages of one session from the store, or all of the user's messages when no session is given."""
+        rows = self.message_store.session_messages(user_id, session_id) if session_id else []
+        if not rows:
+            rows = self.message_store.user_messages(user_id)
+        return [
+            HumanMessage(content=row.text) if row.role == chat_log.USER else AIMessage(content=row.text)
+            for row in rows
+        ]
+
+    def generate_recommendation(self, chat_history_file, user_id, session_id=None):
         """Generate personalized recommendations based on chat history."""
         # Load chat history
-        chat_history = self.load_chat_history(chat_history_file)
+        if self.message_store is not None:
+            self.message_store.ensure_imported(user_id, chat_history_file)
+            chat_history = self.load_stored_history(user_id, session_id)
+        else:
+            chat_history = self.load_chat_history(chat_history_file, user_id)
 
         # Structured recommendation prompt
         recommendation_prompt = (
@@ -47,15 +75,12 @@ class CounselorAI:
 
         # Build message context and invoke model directly.
         messages = [self.system_prompt] + chat_history + [HumanMessage(content=recommendation_prompt)]
-        response_obj = self.chat_groq.invoke(messages)
+        response_obj = self.gateway.invoke(self.chat_groq, messages)
         response = response_obj.content if hasattr(response_obj, "content") else str(response_obj)
 
         # Save recommendation to file
-        rec_dir = os.getenv("RECOMMENDATION_DIR", "recommendations")
-        os.makedirs(rec_dir, exist_ok=True)
-        rec_file_path = os.path.join(rec_dir, f"chat_{user_id}.txt")
-        with open(rec_file_path, "w", encoding="utf-8") as f:
-            f.write(response)
+        storage = self.storage or LocalStorage(os.getenv("RECOMMENDATION_DIR", "recommendations"))
+        storage.write(f"chat_{user_id}.txt", response.encode("utf-8"))
 
         return response
 
@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import chat_log
+import scoring
+
+CHAT_KEY_PATTERN = re.compile(r"^chat_history_(?P<userid>.+)\.txt$")
+
+# Per-process classifier, built once by _init_worker.
+_worker_classifier = None
+
+
+def _init_worker(dataset_path, embedding_path, model_name):
+    global _worker_classifier
+    from RAGclassifier import RAGSimilarityClassifier
+    _worker_classifier = RAGSimilarityClassifier(dataset_path, embedding_path, model_name=model_name)
+
+
+def _classify_batch(texts, encode_batch_size):
+    return [str(label) for label in _worker_classifier.classify(texts, batch_size=encode_batch_size)]
+
+
+class Checkpoint:
+    def __init__(self, path, corpus_version=None):
+        """
+        Set of users already re-scored against one corpus version, persisted after every
+        completed batch. A checkpoint left by a run over another corpus version is ignored.
+        """
+        self.path = path
+        self.corpus_version = corpus_version
+        self.completed = set()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("corpus") == self.corpus_version:
+                self.completed = set(data.get("completed", []))
+            else:
+                print("[rescore] Checkpoint was written for a different corpus; starting over")
+        return self
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"completed": sorted(self.completed), "corpus": self.corpus_version,
+                       "updated_at": time.time()}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def iter_user_rows(chat_storage, message_store, get_chat_file, skip):
+    """
+    Yield (userid, [user message rows]) for every user, one user at a time. Rows come from the
+    message store so their labels can be written back; legacy text logs are imported first.
+    """
+    user_ids = set(message_store.user_ids())
+    for key in chat_storage.list():
+        match = CHAT_KEY_PATTERN.match(key)
+        if match:
+            user_ids.add(match.group("userid"))
+    for user_id in sorted(user_ids - set(skip)):
+        message_store.ensure_imported(user_id, get_chat_file(user_id))
+        yield user_id, message_store.user_messages(user_id, role=chat_log.USER)
+
+
+def iter_batches(user_rows, batch_size):
+    """
+    Pack messages from consecutive users into batches of about `batch_size` texts.
+    Each batch is (texts, owners) where owners is [(userid, [seq of each text], is_last_chunk)].
+    """
+    texts, owners = [], []
+    for user_id, rows in user_rows:
+        if not rows:
+            owners.append((user_id, [], True))
+            continue
+        start = 0
+        while start < len(rows):
+            chunk = rows[start:start + batch_size - len(texts)]
+            start += len(chunk)
+            texts.extend(row.text for row in chunk)
+            owners.append((user_id, [row.seq for row in chunk], start >= len(rows)))
+            if len(texts) >= batch_size:
+                yield texts, owners
+                texts, owners = [], []
+    if owners:
+        yield texts, owners
+
+
+def rescore(dataset_path, embedding_path, checkpoint_path, workers=2, batch_size=2048,
+            encode_batch_size=256, model_name='all-MiniLM-L6-v2', restart=False):
+    """
+    Re-label every stored user message with the current corpus, replace the cached per-message
+    labels, and write a new mental_scores row per user from those labels.
+    """
+    from app import chat_storage, get_chat_file, message_store, record_mental_score
+    from corpus_index import CorpusIndex
+
+    checkpoint = Checkpoint(checkpoint_path, CorpusIndex(dataset_path, embedding_path).version())
+    if not restart:
+        checkpoint.load()
+        if checkpoint.completed:
+            print(f"[rescore] Resuming: {len(checkpoint.completed)} users already done")
+
+    batches = iter_batches(iter_user_rows(chat_storage, message_store, get_chat_file, checkpoint.completed), batch_size)
+    pending_counts = {}
+    users_done = 0
+    messages_done = 0
+    started = time.perf_counter()
+
+    def handle(owners, labels):
+        nonlocal users_done, messages_done
+        position = 0
+        for user_id, seqs, is_last in owners:
+            chunk_labels = labels[position:position + len(seqs)]
+            # The app reuses cached labels, so they must agree with the score written below.
+            message_store.set_labels(user_id, list(zip(seqs, chunk_labels)))
+            pending_counts.setdefault(user_id, Counter()).update(chunk_labels)
+            position += len(seqs)
+            messages_done += len(seqs)
+            if is_last:
+                label_counts = dict(pending_counts.pop(user_id))
+                if label_counts:
+                    record_mental_score(user_id, scoring.mood_score(label_counts), label_counts)
+                checkpoint.completed.add(user_id)
+                users_done += 1
+        checkpoint.save()
+
+        elapsed = time.perf_counter() - started
+        print(f"[rescore] users={users_done}, messages={messages_done}, "
+              f"throughput={messages_done / elapsed if elapsed else 0:.1f} msg/s")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(dataset_path, embedding_path, model_name)) as pool:
+        # Results are consumed in submission order so a user's chunks are always complete before scoring;
+        # a bounded window keeps every worker busy without loading all chat logs into memory.
+        in_flight = deque()
+        for texts, owners in batches:
+            in_flight.append((pool.submit(_classify_batch, texts, encode_batch_size), owners))
+            if len(in_flight) >= workers * 2:
+                future, done_owners = in_flight.popleft()
+                handle(done_owners, future.result())
+        while in_flight:
+            future, done_owners = in_flight.popleft()
+            handle(done_owners, future.result())
+
+    # A finished run leaves nothing to resume; the next re-score starts from the first user.
+    checkpoint.clear()
+    elapsed = time.perf_counter() - started
+    print(f"[rescore] Done in {elapsed:.1f}s. users={users_done}, messages={messages_done}, "
+          f"throughput={messages_done / elapsed if elapsed else 0:.1f} msg/s")
+    return users_done, messages_done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score every stored chat log into mental_scores.")
+    parser.add_argument("--dataset", default='./model/balanced_cleaned_dataset.csv')
+    parser.add_argument("--embeddings", default='./model/embeddings.npy')
+    parser.add_argument("--checkpoint", default='./rescore_checkpoint.json')
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--batch-size", type=int, default=2048, help="Messages per cross-user batch.")
+    parser.add_argument("--encode-batch-size", type=int, default=256, help="Encoder batch size inside a worker.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the existing checkpoint.")
+    args = parser.parse_args()
+
+    rescore(args.dataset, args.embeddings, args.checkpoint, workers=args.workers, batch_size=args.batch_size,
+            encode_batch_size=args.encode_batch_size, restart=args.restart)
@@ -0,0 +1,23 @@
+# Calculate an overall score (example: stress = 1, anxiety = 2, depression = 3, PTSD = 4)
+MOOD_WEIGHTS = {
+    "normal": 4,
+    "stress": 3,
+    "anxiety": 2,
+    "depression": 1,
+    "PTSD": 0
+}
+
+
+def mood_score(label_counts: dict):
+    """Weighted average of MOOD_WEIGHTS over the predicted labels, rounded to 2 places."""
+    total_score = sum(MOOD_WEIGHTS.get(label, 0) * count for label, count in label_counts.items())
+    total_msgs = sum(label_counts.values())
+    return round(total_score / total_msgs, 2) if total_msgs > 0 else 0
+
+
+def suicide_percentage(label_counts: dict):
+    """Share of messages labelled 'suicide', in percent. None when there is nothing to evaluate."""
+    total = sum(label_counts.values())
+    if total == 0:
+        return None
+    return (label_counts.get('suicide', 0) / total) * 100
@@ -0,0 +1,144 @@
+// Page state and endpoint URLs come from data attributes on this script's tag.
+const pageConfig = document.currentScript.dataset;
+const activePage = pageConfig.activePage;
+const pageLoader = document.getElementById("pageLoader");
+const loaderText = document.getElementById("loaderText");
+
+function showLoader(message) {
+    if (loaderText) loaderText.textContent = message || "Loading...";
+    if (pageLoader) pageLoader.classList.add("active");
+    console.log(`[ui-loader] SHOW -> ${message || "Loading..."}`);
+}
+
+function bindTabLoader() {
+    const tabLinks = document.querySelectorAll(".js-tab-link");
+    tabLinks.forEach((link) => {
+        link.addEventListener("click", () => {
+            const label = (link.textContent || "tab").trim();
+            console.log(`[ui-loader] tab click -> ${label}`);
+            showLoader(`Switching to ${label}...`);
+        });
+    });
+}
+
+bindTabLoader();
+
+if (activePage === "chat") {
+    const chatForm = document.getElementById("chatForm");
+    const chatInput = document.getElementById("chatInput");
+    const chatMessages = document.getElementById("chatMessages");
+    const endChatBtn = document.getElementById("endChatBtn");
+
+    function addMessage(text, sender) {
+        const row = document.createElement("div");
+        row.className = sender === "user"
+            ? "flex items-end gap-3 max-w-[80%] ml-auto flex-row-reverse"
+            : "flex items-end gap-3 max-w-[80%]";
+
+        const avatar = document.createElement("div");
+        avatar.className = sender === "user"
+            ? "w-10 h-10 rounded-full bg-primary flex items-center justify-center shrink-0 shadow-sm border border-white"
+            : "w-10 h-10 rounded-full bg-soft-lavender flex items-center justify-center shrink-0 shadow-sm border border-white";
+        avatar.innerHTML = sender === "user"
+            ? '<svg class="w-5 h-5 text-brand-blue" viewBox="0 0 24 24" fill="none"><path d="M12 12a4 4 0 1 0 0-8 4 4 0 0 0 0 8Zm0 2c-3.3 0-6 2.2-6 5h12c0-2.8-2.7-5-6-5Z" stroke="currentColor" stroke-width="1.8" stroke-linecap="round"/></svg>'
+            : '<svg class="w-5 h-5 text-brand-blue" viewBox="0 0 24 24" fill="none"><path d="M9.5 12a2.5 2.5 0 1 1 0-5 2.5 2.5 0 0 1 0 5Zm5 0a2.5 2.5 0 1 1 0-5 2.5 2.5 0 0 1 0 5ZM6 19a3.5 3.5 0 0 1 7 0m1 0a3.5 3.5 0 0 1 7 0" stroke="currentColor" stroke-width="1.8" stroke-linecap="round"/></svg>';
+
+        const wrap = document.createElement("div");
+        wrap.className = sender === "user" ? "flex flex-col gap-1 items-end" : "flex flex-col gap-1";
+
+        const tag = document.createElement("span");
+        tag.className = sender === "user"
+            ? "text-[11px] font-bold text-slate-400 mr-2 uppercase tracking-tight"
+            : "text-[11px] font-bold text-slate-400 ml-2 uppercase tracking-tight";
+        tag.textContent = sender === "user" ? "You" : "MindEase AI";
+
+        const bubble = document.createElement("div");
+        bubble.className = sender === "user"
+            ? "message-bubble-user px-5 py-4 rounded-2xl rounded-br-none text-slate-800 leading-relaxed border border-white/50"
+            : "message-bubble-ai px-5 py-4 rounded-2xl rounded-bl-none text-slate-700 leading-relaxed border border-white/50";
+        bubble.textContent = text;
+
+        wrap.appendChild(tag);
+        wrap.appendChild(bubble);
+        row.appendChild(avatar);
+        row.appendChild(wrap);
+        chatMessages.appendChild(row);
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+        return bubble;
+    }
+
+    async function sendMessage(message) {
+        const res = await fetch(pageConfig.getResponseUrl, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ user_input: message })
+        });
+        const data = await res.json();
+        if (!res.ok) {
+            throw new Error(data.error || "Failed to get response.");
+        }
+        return data.response;
+    }
+
+    chatForm.addEventListener("submit", async (event) => {
+        event.preventDefault();
+        const message = chatInput.value.trim();
+        if (!message) return;
+
+        addMessage(message, "user");
+        chatInput.value = "";
+        const pendingBubble = addMessage("Thinking...", "ai");
+
+        try {
+            const reply = await sendMessage(message);
+            if (pendingBubble && pendingBubble.textContent === "Thinking...") {
+                pendingBubble.textContent = reply;
+            } else {
+                addMessage(reply, "ai");
+            }
+        } catch (error) {
+            if (pendingBubble && pendingBubble.textContent === "Thinking...") {
+                pendingBubble.textContent = "Unable to respond right now. Please try again.";
+            } else {
+                addMessage("Unable to respond right now. Please try again.", "ai");
+            }
+        }
+    });
+
+    endChatBtn.addEventListener("click", async () => {
+        try {
+            console.log("[end_chat] Clicked end chat.");
+            showLoader("Ending chat and preparing recommendation...");
+            const res = await fetch(pageConfig.endChatUrl, { method: "POST" });
+            const data = await res.json();
+            if (!res.ok) {
+                console.log("[end_chat] API error:", data);
+                throw new Error(data.error || "Unable to end chat.");
+            }
+            console.log("[end_chat] Success:", data);
+            const redirectUrl = data.redirect_url || pageConfig.recommendationUrl;
+            window.location.href = redirectUrl;
+        } catch (error) {
+            console.log("[end_chat] Exception:", error);
+            if (pageLoader) pageLoader.classList.remove("active");
+            addMessage("Unable to end chat right now.", "ai");
+        }
+    });
+}
+
+if (activePage === "recommendation") {
+    const recommendationText = document.getElementById("recommendationText");
+    async function loadRecommendation() {
+        try {
+            const res = await fetch(pageConfig.getRecommendationUrl);
+            if (!res.ok) {
+                throw new Error(`Recommendation request failed: ${res.status}`);
+            }
+            const text = await res.text();
+            recommendationText.textContent = text || "No recommendation available yet.";
+        } catch (error) {
+            recommendationText.textContent = "Could not load recommendation right now.";
+        }
+    }
+    loadRecommendation();
+}
@@ -0,0 +1,33 @@
+tailwind.config = {
+    darkMode: "class",
+    theme: {
+        extend: {
+            colors: {
+                "primary": "#e3f0fd",
+                "background-light": "#f6f7f8",
+                "background-dark": "#101922",
+                "pastel-green": "#e8f5e9",
+                "soft-lavender": "#f3e5f5",
+                "brand-blue": "#4b739b",
+            },
+            fontFamily: {
+                "display": ["Inter", "sans-serif"]
+            },
+            animation: {
+                "breathing-glow": "breathing 10s ease-in-out infinite",
+                "float": "float 6s ease-in-out infinite",
+                "pulse-slow": "pulse 4s cubic-bezier(0.4, 0, 0.6, 1) infinite",
+            },
+            keyframes: {
+                breathing: {
+                    "0%, 100%": { filter: "drop-shadow(0 0 2px rgba(75, 115, 155, 0.2))", transform: "scale(1)" },
+                    "50%": { filter: "drop-shadow(0 0 15px rgba(75, 115, 155, 0.4))", transform: "scale(1.05)" },
+                },
+                float: {
+                    "0%, 100%": { transform: "translateY(0)" },
+                    "50%": { transform: "translateY(-10px)" },
+                }
+            }
+        },
+    },
+}
@@ -0,0 +1,411 @@
+import fcntl
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class StorageBackend:
+    """
+    Minimal key/value blob store for chat logs, recommendations and score history.
+    Keys are '/'-separated relative paths such as 'chat_logs/chat_history_<userid>.txt'.
+    """
+
+    def read(self, key):
+        """Return the bytes stored at key, or None if it does not exist."""
+        raise NotImplementedError
+
+    def read_range(self, key, start):
+        """Return the bytes from offset `start` to the end."""
+        data = self.read(key)
+        return None if data is None else data[start:]
+
+    def write(self, key, data):
+        raise NotImplementedError
+
+    def append(self, key, data):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def list(self, prefix=""):
+        raise NotImplementedError
+
+    def stat(self, key):
+        """
+        Return (generation, size) or None if missing. The generation changes on write()/delete()
+        but not on append(), so readers can fetch just the appended tail.
+        """
+        raise NotImplementedError
+
+    def exists(self, key):
+        return self.stat(key) is not None
+
+    def lock(self, key):
+        """
+        Context manager holding an exclusive lock on `key` for read-modify-write sequences,
+        across threads, processes and (for shared backends) nodes. Not re-entrant.
+        """
+        raise NotImplementedError
+
+    def local_path(self, key):
+        """A local file path holding the current contents, for readers that need a real file."""
+        raise NotImplementedError
+
+    def scoped(self, prefix):
+        return ScopedStorage(self, prefix)
+
+
+class LocalStorage(StorageBackend):
+    LOCK_SUFFIX = ".lock"
+
+    def __init__(self, root):
+        """Files under `root`; the default single-machine backend."""
+        self.root = root
+
+    def local_path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def read(self, key):
+        try:
+            with open(self.local_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def read_range(self, key, start):
+        try:
+            with open(self.local_path(key), "rb") as f:
+                f.seek(start)
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key, data):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def append(self, key, data):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            f.write(data)
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def lock(self, key):
+        path = self.local_path(key) + self.LOCK_SUFFIX
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # flock conflicts between separate open() calls, so this also excludes other threads.
+        with open(path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def list(self, prefix=""):
+        # Only walk the directory the prefix points into, not the whole root.
+        prefix_dir = prefix.rsplit("/", 1)[0] if "/" in prefix else ""
+        keys = []
+        for dirpath, _, filenames in os.walk(self.local_path(prefix_dir) if prefix_dir else self.root):
+            rel_dir = os.path.relpath(dirpath, self.root)
+            for name in filenames:
+                if name.endswith((".tmp", self.LOCK_SUFFIX)):
+                    continue
+                key = name if rel_dir == "." else "/".join(rel_dir.split(os.sep) + [name])
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+    def stat(self, key):
+        try:
+            st = os.stat(self.local_path(key))
+        except FileNotFoundError:
+            return None
+        # write() replaces the file, so a new inode marks a new generation.
+        return st.st_ino, st.st_size
+
+
+class InMemoryStorage(StorageBackend):
+    def __init__(self):
+        """In-process stand-in for a networked backend, for development and tests."""
+        self._data = {}
+        self._generations = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def read(self, key):
+        with self._lock:
+            data = self._data.get(key)
+            return None if data is None else bytes(data)
+
+    def write(self, key, data):
+        with self._lock:
+            self._data[key] = bytearray(data)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def append(self, key, data):
+        with self._lock:
+            if key not in self._data:
+                self._data[key] = bytearray()
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._data[key].extend(data)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def list(self, prefix=""):
+        with self._lock:
+            return sorted(k for k in self._data if k.startswith(prefix))
+
+    def stat(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            return self._generations[key], len(self._data[key])
+
+
+class RedisStorage(StorageBackend):
+    GENERATION_SUFFIX = "#gen"
+    LOCK_SUFFIX = "#lock"
+
+    def __init__(self, url, namespace="mindease:", lock_timeout=60, lock_wait=30):
+        """Blobs in Redis, shared by every app instance. APPEND keeps chat log writes atomic."""
+        if redis is None:
+            raise RuntimeError("The 'redis' package is required for STORAGE_BACKEND=redis.")
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+
+    def _key(self, key):
+        return f"{self.namespace}{key}"
+
+    def read(self, key):
+        return self.client.get(self._key(key))
+
+    def read_range(self, key, start):
+        if not self.client.exists(self._key(key)):
+            return None
+        return self.client.getrange(self._key(key), start, -1)
+
+    def write(self, key, data):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(self._key(key), data)
+        pipe.incr(self._key(key) + self.GENERATION_SUFFIX)
+        pipe.execute()
+
+    def append(self, key, data):
+        self.client.append(self._key(key), data)
+
+    def delete(self, key):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._key(key))
+        pipe.incr(self._key(key) + self.GENERATION_SUFFIX)
+        pipe.execute()
+
+    def lock(self, key):
+        # SET NX with an expiry, so a crashed holder cannot block the key forever.
+        return self.client.lock(self._key(key) + self.LOCK_SUFFIX, timeout=self.lock_timeout,
+                                blocking_timeout=self.lock_wait)
+
+    def list(self, prefix=""):
+        keys = []
+        for raw in self.client.scan_iter(match=self._key(prefix) + "*"):
+            key = raw.decode("utf-8")[len(self.namespace):]
+            if not key.endswith((self.GENERATION_SUFFIX, self.LOCK_SUFFIX)):
+                keys.append(key)
+        return sorted(keys)
+
+    def stat(self, key):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.exists(self._key(key))
+        pipe.get(self._key(key) + self.GENERATION_SUFFIX)
+        pipe.strlen(self._key(key))
+        exists, generation, size = pipe.execute()
+        if not exists:
+            return None
+        return int(generation or 0), size
+
+
+class CachedStorage(StorageBackend):
+    META_SUFFIX = ".meta"
+
+    def __init__(self, backend, cache_dir):
+        """
+        Read-through local disk cache in front of a shared backend. Every read revalidates
+        with backend.stat(), and appended logs are refreshed by fetching only the new tail.
+
+        The cache dir may be shared by every worker on the host: each cached file has a
+        `.meta` sidecar recording the backend generation and size it holds, and refreshes
+        run under a file lock and replace the cached file atomically.
+        """
+        self.backend = backend
+        self.cache = LocalStorage(cache_dir)
+
+    def _read_meta(self, key):
+        data = self.cache.read(key + self.META_SUFFIX)
+        stat = self.cache.stat(key)
+        if data is None or stat is None:
+            return None
+        meta = json.loads(data)
+        # A meta file that does not describe the cached bytes (e.g. a crash between the two
+        # writes) is ignored and the whole file is fetched again.
+        if meta["size"] != stat[1]:
+            return None
+        return meta["generation"], meta["size"]
+
+    def _store(self, key, generation, data):
+        self.cache.write(key, data)
+        self.cache.write(key + self.META_SUFFIX, json.dumps({"generation": generation, "size": len(data)}).encode("utf-8"))
+
+    def _evict(self, key):
+        self.cache.delete(key + self.META_SUFFIX)
+        self.cache.delete(key)
+
+    def _refresh(self, key):
+        """Bring the cached copy up to date; the caller holds the cache lock for `key`."""
+        remote = self.backend.stat(key)
+        cached = self._read_meta(key)
+
+        if remote is None:
+            self._evict(key)
+            return False
+        if cached == remote:
+            return True
+
+        if cached is not None and cached[0] == remote[0] and remote[1] > cached[1]:
+            tail = self.backend.read_range(key, cached[1])
+            old = self.cache.read(key)
+            if tail is not None and old is not None:
+                self._store(key, remote[0], old + tail)
+                return True
+
+        data = self.backend.read(key)
+        if data is None:
+            self._evict(key)
+            return False
+        self._store(key, remote[0], data)
+        return True
+
+    def local_path(self, key):
+        with self.cache.lock(key):
+            self._refresh(key)
+        return self.cache.local_path(key)
+
+    def read(self, key):
+        with self.cache.lock(key):
+            if not self._refresh(key):
+                return None
+            return self.cache.read(key)
+
+    def read_range(self, key, start):
+        with self.cache.lock(key):
+            if not self._refresh(key):
+                return None
+            return self.cache.read_range(key, start)
+
+    def write(self, key, data):
+        with self.cache.lock(key):
+            self.backend.write(key, data)
+            self._evict(key)
+
+    def append(self, key, data):
+        self.backend.append(key, data)
+
+    def delete(self, key):
+        with self.cache.lock(key):
+            self.backend.delete(key)
+            self._evict(key)
+
+    def lock(self, key):
+        return self.backend.lock(key)
+
+    def list(self, prefix=""):
+        return self.backend.list(prefix)
+
+    def stat(self, key):
+        return self.backend.stat(key)
+
+
+class ScopedStorage(StorageBackend):
+    def __init__(self, backend, prefix):
+        """View of `backend` with every key placed under `prefix/`."""
+        self.backend = backend
+        self.prefix = prefix.strip("/") + "/"
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def read(self, key):
+        return self.backend.read(self._key(key))
+
+    def read_range(self, key, start):
+        return self.backend.read_range(self._key(key), start)
+
+    def write(self, key, data):
+        self.backend.write(self._key(key), data)
+
+    def append(self, key, data):
+        self.backend.append(self._key(key), data)
+
+    def delete(self, key):
+        self.backend.delete(self._key(key))
+
+    def list(self, prefix=""):
+        return [k[len(self.prefix):] for k in self.backend.list(self._key(prefix))]
+
+    def stat(self, key):
+        return self.backend.stat(self._key(key))
+
+    def lock(self, key):
+        return self.backend.lock(self._key(key))
+
+    def local_path(self, key):
+        return self.backend.local_path(self._key(key))
+
+
+def get_storage(base_dir):
+    """
+    Build the storage configured by STORAGE_BACKEND:
+      - local (default): files under base_dir
+      - redis: STORAGE_URL (default redis://localhost:6379/0), cached under STORAGE_CACHE_DIR
+      - memory: in-process fake, cached the same way as redis
+    """
+    kind = os.getenv("STORAGE_BACKEND", "local").lower()
+    if kind == "local":
+        return LocalStorage(base_dir)
+
+    if kind == "redis":
+        backend = RedisStorage(os.getenv("STORAGE_URL", "redis://localhost:6379/0"))
+    elif kind == "memory":
+        backend = InMemoryStorage()
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {kind}")
+
+    cache_dir = os.getenv("STORAGE_CACHE_DIR", os.path.join(base_dir, "storage_cache"))
+    print(f"[storage] Using {kind} backend with local cache at {cache_dir}")
+    return CachedStorage(backend, cache_dir)
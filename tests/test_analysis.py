@@ -0,0 +1,65 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import AnalysisService
+
+Row = namedtuple("Row", "seq text")
+
+
+class FakeMessageStore:
+    def __init__(self, texts):
+        self.rows = [Row(seq, text) for seq, text in enumerate(texts, 1)]
+
+    def ensure_imported(self, user_id, path):
+        pass
+
+    def last_seq(self, user_id):
+        return self.rows[-1].seq if self.rows else 0
+
+    def user_messages(self, user_id, role=None):
+        return list(self.rows)
+
+
+class AnalysisServiceTest(unittest.TestCase):
+    def test_concurrent_callers_share_one_computation(self):
+        classified = []
+        recorded = []
+
+        def classify(user_id, rows):
+            classified.append(user_id)
+            time.sleep(0.05)
+            return {"Normal": len(rows)}
+
+        service = AnalysisService(FakeMessageStore(["hi", "hello"]), lambda user_id: None, classify,
+                                  on_computed=recorded.append)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(service.analyze("u1"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results.append(service.analyze("u1"))
+
+        self.assertEqual(classified, ["u1"])
+        self.assertEqual(len(recorded), 1)
+        self.assertEqual({id(result) for result in results}, {id(recorded[0])})
+        self.assertEqual(service._in_flight, {})
+
+    def test_failed_computation_is_not_left_in_flight(self):
+        def classify(user_id, rows):
+            raise RuntimeError("model down")
+
+        service = AnalysisService(FakeMessageStore(["hi"]), lambda user_id: None, classify)
+        with self.assertRaises(RuntimeError):
+            service.analyze("u1")
+        self.assertEqual(service._in_flight, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_archive import ArchiveSegmentMissing, ChatArchive
+from storage import CachedStorage, InMemoryStorage, LocalStorage
+
+USER = "u1"
+KEY = ChatArchive.hot_key(USER)
+
+
+class ChatArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def append_turn(self, archive, i):
+        with archive.chat_storage.lock(KEY):
+            archive.chat_storage.append(KEY, f"You: message {i}\nAI: reply {i}\n".encode("utf-8"))
+
+    def history(self, archive):
+        return [m.text for m in archive.iter_messages(USER, include_archive=True)]
+
+    def run_concurrently(self, storage_a, storage_b):
+        # Two app instances over one storage, both appending, closing and compacting.
+        archives = [ChatArchive(storage_a), ChatArchive(storage_b)]
+        errors = []
+
+        def worker(archive, first):
+            try:
+                for i in range(first, first + 40):
+                    self.append_turn(archive, i)
+                    if i % 3 == 0:
+                        archive.mark_closed(USER)
+                    if i % 5 == 0:
+                        archive.compact(USER)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(archive, n * 1000)) for n, archive in enumerate(archives)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        archives[0].mark_closed(USER)
+        archives[1].compact(USER)
+        index = archives[0].read_index(USER)
+        self.assertGreater(len(index["segments"]), 1)
+        self.assertNotIn("pending_trim", index)
+        for archive in archives:
+            texts = self.history(archive)
+            self.assertEqual(len(texts), 160)
+            for n in (0, 1000):
+                mine = [t for t in texts if t in {f"message {i}" for i in range(n, n + 40)}]
+                self.assertEqual(mine, [f"message {i}" for i in range(n, n + 40)])
+
+    def test_concurrent_compaction_on_local_storage(self):
+        self.run_concurrently(LocalStorage(self.tmp), LocalStorage(self.tmp))
+
+    def test_concurrent_compaction_on_shared_backend(self):
+        backend = InMemoryStorage()
+        self.run_concurrently(CachedStorage(backend, os.path.join(self.tmp, "a")),
+                              CachedStorage(backend, os.path.join(self.tmp, "b")))
+
+    def test_interrupted_trim_is_finished_by_the_next_compaction(self):
+        storage = LocalStorage(self.tmp)
+        archive = ChatArchive(storage)
+        self.append_turn(archive, 1)
+        archive.mark_closed(USER)
+        self.append_turn(archive, 2)
+
+        # Stop after the segment is indexed but before the hot log is trimmed.
+        finish = archive._finish_pending
+        archive._finish_pending = lambda user_id: archive.read_index(user_id)
+        archive.compact(USER)
+        archive._finish_pending = finish
+
+        self.assertIn("pending_trim", archive.read_index(USER))
+        self.assertEqual(self.history(ChatArchive(storage)), ["message 1", "reply 1", "message 2", "reply 2"])
+        self.assertNotIn("pending_trim", archive.read_index(USER))
+        self.assertEqual(storage.read(f"chat_logs/{KEY}"), b"You: message 2\nAI: reply 2\n")
+
+    def test_missing_segment_raises(self):
+        storage = LocalStorage(self.tmp)
+        archive = ChatArchive(storage)
+        self.append_turn(archive, 1)
+        archive.mark_closed(USER)
+        entry = archive.compact(USER)
+        storage.delete(f"chat_archive/{USER}/{entry['name']}")
+        with self.assertRaises(ArchiveSegmentMissing):
+            self.history(archive)
+
+
+if __name__ == "__main__":
+    unittest.main()
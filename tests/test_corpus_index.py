@@ -0,0 +1,40 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from corpus_index import CorpusIndex
+
+
+class CorpusIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.cwd = os.getcwd()
+        self.addCleanup(os.chdir, self.cwd)
+        os.chdir(self.tmp)
+        pd.DataFrame({"text": ["a", "b"], "label": ["Normal", "Anxiety"]}).to_csv("d.csv", index=False)
+        np.save("e.npy", np.eye(2, 4, dtype=np.float32))
+
+    def test_bare_root_paths_are_used_as_given(self):
+        corpus = CorpusIndex("d.csv", "e.npy").load()
+        self.assertEqual(corpus.ntotal, 2)
+
+        corpus.append(["c"], ["Depression"], np.array([[0, 0, 1, 0]], dtype=np.float32))
+        self.assertEqual(CorpusIndex("d.csv", "e.npy").load().ntotal, 3)
+
+        corpus.compact()
+        reloaded = CorpusIndex("d.csv", "e.npy").load()
+        self.assertEqual(reloaded.ntotal, 3)
+        _, _, labels = reloaded.search(np.array([[0, 0, 1, 0]], dtype=np.float32))
+        self.assertEqual(list(labels), ["Depression"])
+
+
+if __name__ == "__main__":
+    unittest.main()
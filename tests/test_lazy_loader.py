@@ -0,0 +1,34 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lazy_loader import LazyRegistry
+
+
+class LazyRegistryTest(unittest.TestCase):
+    def test_failed_build_is_retried_after_the_cooldown(self):
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise MemoryError("bad_alloc")
+            return "model"
+
+        registry = LazyRegistry(retry_after=60)
+        registry.register("model", flaky)
+        self.assertIsNone(registry.get_optional("model"))
+        self.assertIsNone(registry.get_optional("model"))
+        self.assertEqual(len(attempts), 1)
+        self.assertEqual(registry.startup_report()["components"]["model"]["status"], "failed")
+
+        registry.retry_after = 0
+        self.assertEqual(registry.get("model"), "model")
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(registry.startup_report()["components"]["model"]["status"], "loaded")
+
+
+if __name__ == "__main__":
+    unittest.main()
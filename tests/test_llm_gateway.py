@@ -0,0 +1,131 @@
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_llm_server
+from fake_llm_server import FakeLLMHandler
+from llm_gateway import (CircuitBreaker, CircuitOpen, GatewayOverloaded, GatewayTimeout, LLMGateway,
+                         LLMUnavailable)
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"upstream returned {status_code}")
+        self.status_code = status_code
+
+
+class FakeServerClient:
+    """Stands in for ChatGroq: one chat completion request per invoke()."""
+
+    def __init__(self, port):
+        self.port = port
+
+    def invoke(self, messages):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        try:
+            body = json.dumps({"model": "fake", "messages": [{"role": "user", "content": m} for m in messages]})
+            connection.request("POST", "/openai/v1/chat/completions", body=body,
+                               headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = json.loads(response.read())
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise UpstreamError(response.status)
+        return data["choices"][0]["message"]["content"]
+
+
+class LLMGatewayTest(unittest.TestCase):
+    def start_server(self, **options):
+        server = fake_llm_server.serve(port=0, **options)
+        thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return FakeServerClient(server.server_address[1])
+
+    def test_success(self):
+        client = self.start_server()
+        gateway = LLMGateway()
+        self.assertIn("You said: hello", gateway.invoke(client, ["hello"]))
+        self.assertEqual(gateway.stats()["circuit"], "closed")
+
+    def test_full_queue_is_shed_immediately(self):
+        client = self.start_server(delay=0.5)
+        gateway = LLMGateway(max_concurrency=1, max_queue=1, timeout=5)
+        callers = [threading.Thread(target=gateway.invoke, args=(client, ["hi"])) for _ in range(2)]
+        for caller in callers:
+            caller.start()
+            time.sleep(0.1)
+
+        started = time.monotonic()
+        with self.assertRaises(GatewayOverloaded):
+            gateway.invoke(client, ["one too many"])
+        self.assertLess(time.monotonic() - started, 0.1)
+        for caller in callers:
+            caller.join()
+        self.assertEqual(gateway.stats()["circuit"], "closed")
+
+    def test_deadline(self):
+        client = self.start_server(delay=1.0)
+        gateway = LLMGateway(timeout=0.3)
+        started = time.monotonic()
+        with self.assertRaises(GatewayTimeout):
+            gateway.invoke(client, ["slow"])
+        self.assertLess(time.monotonic() - started, 0.8)
+
+    def test_retries_with_backoff_until_success(self):
+        client = self.start_server(fail_first=2)
+        gateway = LLMGateway(max_retries=2, backoff_base=0.01, backoff_max=0.05)
+        self.assertIn("You said: again", gateway.invoke(client, ["again"]))
+        self.assertEqual(FakeLLMHandler.served, 3)
+        self.assertEqual(gateway.breaker.consecutive_failures, 0)
+
+    def test_gives_up_after_max_retries(self):
+        client = self.start_server(failure_rate=1.0)
+        gateway = LLMGateway(max_retries=2, backoff_base=0.01, backoff_max=0.05)
+        with self.assertRaises(LLMUnavailable):
+            gateway.invoke(client, ["down"])
+        self.assertEqual(FakeLLMHandler.served, 3)
+
+    def test_client_errors_are_not_retried_and_do_not_open_the_circuit(self):
+        client = self.start_server(failure_rate=1.0, failure_status=401)
+        gateway = LLMGateway(max_retries=2, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30))
+        for _ in range(4):
+            with self.assertRaises(UpstreamError):
+                gateway.invoke(client, ["bad key"])
+        self.assertEqual(FakeLLMHandler.served, 4)
+        self.assertEqual(gateway.stats()["circuit"], "closed")
+
+    def test_breaker_opens_then_half_opens_then_closes(self):
+        client = self.start_server(failure_rate=1.0)
+        gateway = LLMGateway(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+        for _ in range(2):
+            with self.assertRaises(LLMUnavailable):
+                gateway.invoke(client, ["down"])
+        self.assertEqual(gateway.stats()["circuit"], "open")
+        with self.assertRaises(CircuitOpen):
+            gateway.invoke(client, ["fail fast"])
+        self.assertEqual(FakeLLMHandler.served, 2)
+
+        # A failed probe opens the circuit again.
+        time.sleep(0.25)
+        self.assertEqual(gateway.stats()["circuit"], "half_open")
+        with self.assertRaises(LLMUnavailable):
+            gateway.invoke(client, ["probe"])
+        self.assertEqual(gateway.stats()["circuit"], "open")
+
+        FakeLLMHandler.failure_rate = 0.0
+        time.sleep(0.25)
+        self.assertIn("You said: probe", gateway.invoke(client, ["probe"]))
+        self.assertEqual(gateway.stats()["circuit"], "closed")
+
+
+if __name__ == "__main__":
+    unittest.main()
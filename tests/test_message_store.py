@@ -0,0 +1,69 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_store import LEGACY_SESSION, MessageStore
+from storage import InMemoryStorage
+
+
+class SharedLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        shared = InMemoryStorage().scoped("messages")
+        # Two nodes, each with its own SQLite file, sharing one message log.
+        self.node_a = MessageStore(os.path.join(self.tmp, "a.db"), shared_log=shared)
+        self.node_b = MessageStore(os.path.join(self.tmp, "b.db"), shared_log=shared)
+
+    def test_turns_written_on_one_node_are_read_on_the_other(self):
+        self.assertEqual(self.node_a.append("u1", "s1", [("user", "hello"), ("ai", "hi there")]), [1, 2])
+        self.assertEqual([(r.seq, r.role, r.text) for r in self.node_b.recent_messages("u1", 10)],
+                         [(1, "user", "hello"), (2, "ai", "hi there")])
+
+        self.assertEqual(self.node_b.append("u1", "s2", [("user", "again")]), [3])
+        self.assertEqual(self.node_a.last_seq("u1"), 3)
+        self.assertEqual([r.text for r in self.node_a.session_messages("u1", "s2")], ["again"])
+        self.assertEqual([r.seq for r in self.node_a.user_messages("u1", role="user")], [1, 3])
+
+    def test_labels_stay_local(self):
+        self.node_a.append("u1", "s1", [("user", "hello")])
+        self.node_a.set_labels("u1", [(1, "Normal")])
+        self.node_a.append("u1", "s1", [("user", "more")])
+        self.assertEqual([r.label for r in self.node_a.user_messages("u1")], ["Normal", None])
+        self.assertEqual([r.label for r in self.node_b.user_messages("u1")], [None, None])
+
+    def test_legacy_log_is_imported_once(self):
+        path = os.path.join(self.tmp, "chat_history_u1.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("You: hello\nAI: hi\n")
+        self.node_a.ensure_imported("u1", path)
+        self.node_b.ensure_imported("u1", path)
+        rows = self.node_b.user_messages("u1")
+        self.assertEqual([(r.session_id, r.text) for r in rows], [(LEGACY_SESSION, "hello"), (LEGACY_SESSION, "hi")])
+
+
+class LocalStoreTest(unittest.TestCase):
+    def test_schema_is_created_on_first_use(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        store = MessageStore(os.path.join(tmp, "users.db"))
+        self.assertFalse(store.has_messages("u1"))
+        self.assertEqual(store.append("u1", "s1", [("user", "hello")]), [1])
+        self.assertEqual([r.text for r in store.search("u1", "hello")], ["hello"])
+
+    def test_search_treats_user_text_literally(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        store = MessageStore(os.path.join(tmp, "users.db"))
+        store.append("u1", "s1", [("user", "I can't sleep"), ("user", "sleep is fine OR not")])
+        self.assertEqual([r.text for r in store.search("u1", "can't")], ["I can't sleep"])
+        self.assertEqual(len(store.search("u1", 'sleep "OR')), 1)
+        self.assertEqual(store.search("u1", "  "), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_server import MicroBatcher, ModelServer
+
+
+class MicroBatcherTest(unittest.TestCase):
+    def test_bad_request_only_fails_its_own_caller(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def upper(texts):
+            if texts == ["block"]:
+                started.set()
+                release.wait()
+            return [text.upper() for text in texts]
+
+        batcher = MicroBatcher(upper, max_batch=64, max_wait=0.5)
+        results = {}
+
+        def call(name, texts):
+            try:
+                results[name] = batcher.submit(texts)
+            except Exception as e:
+                results[name] = e
+
+        # Hold the worker on a first batch so the next two requests are collected together.
+        blocker = threading.Thread(target=call, args=("blocker", ["block"]))
+        blocker.start()
+        started.wait()
+        threads = [threading.Thread(target=call, args=("good", ["a", "b"])),
+                   threading.Thread(target=call, args=("bad", [None]))]
+        for thread in threads:
+            thread.start()
+        while batcher.stats()["queued"] < 2:
+            time.sleep(0.01)
+        release.set()
+        for thread in [blocker, *threads]:
+            thread.join()
+
+        self.assertEqual(results["good"], ["A", "B"])
+        self.assertIsInstance(results["bad"], AttributeError)
+
+    def test_request_texts_must_be_strings(self):
+        self.assertEqual(ModelServer.request_texts({"texts": ["a"]}), ["a"])
+        for request in ({"texts": [None]}, {"texts": "a"}, {}):
+            with self.assertRaises(ValueError):
+                ModelServer.request_texts(request)
+
+
+if __name__ == "__main__":
+    unittest.main()
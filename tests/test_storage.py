@@ -0,0 +1,67 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import CachedStorage, InMemoryStorage, LocalStorage
+
+
+class CachedStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.backend = InMemoryStorage()
+
+    def test_workers_sharing_a_cache_dir_do_not_duplicate_tails(self):
+        first = CachedStorage(self.backend, self.cache_dir)
+        second = CachedStorage(self.backend, self.cache_dir)
+        self.backend.append("log", b"You: a\n")
+        self.assertEqual(first.read("log"), b"You: a\n")
+        self.assertEqual(second.read("log"), b"You: a\n")
+
+        self.backend.append("log", b"AI: b\n")
+        self.assertEqual(first.read("log"), b"You: a\nAI: b\n")
+        self.assertEqual(second.read("log"), b"You: a\nAI: b\n")
+        self.assertEqual(second.read_range("log", 7), b"AI: b\n")
+
+    def test_rewrite_and_delete_invalidate_other_workers(self):
+        first = CachedStorage(self.backend, self.cache_dir)
+        second = CachedStorage(self.backend, self.cache_dir)
+        first.write("log", b"You: a\nAI: b\n")
+        self.assertEqual(second.read("log"), b"You: a\nAI: b\n")
+
+        second.write("log", b"AI: c\n")
+        self.backend.append("log", b"You: d\n")
+        self.assertEqual(first.read("log"), b"AI: c\nYou: d\n")
+
+        first.delete("log")
+        self.assertIsNone(second.read("log"))
+
+    def test_stale_meta_forces_full_fetch(self):
+        cached = CachedStorage(self.backend, self.cache_dir)
+        self.backend.append("log", b"You: a\n")
+        cached.read("log")
+        # A worker that died after writing the data but before its meta file.
+        cached.cache.append("log", b"garbage")
+        self.backend.append("log", b"AI: b\n")
+        self.assertEqual(cached.read("log"), b"You: a\nAI: b\n")
+
+
+class LocalStorageTest(unittest.TestCase):
+    def test_list_skips_lock_and_temp_files(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        storage = LocalStorage(root)
+        storage.write("chat_logs/a.txt", b"x")
+        storage.write("scores/a.jsonl", b"x")
+        with storage.lock("chat_logs/a.txt"):
+            self.assertEqual(storage.list("chat_logs/"), ["chat_logs/a.txt"])
+        self.assertEqual(storage.list(), ["chat_logs/a.txt", "scores/a.jsonl"])
+        self.assertEqual(storage.scoped("scores").list(), ["a.jsonl"])
+
+
+if __name__ == "__main__":
+    unittest.main()